@@ -0,0 +1,195 @@
+# Read and clean many log files (installations) in parallel
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import os
+import sys
+import glob
+import json
+import argparse
+import traceback
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import read_data
+import data_store
+import quality
+
+def find_logs(paths, pattern='*.csv'):
+    """
+    Collect the log files to process, together with the installation they
+    belong to. A file that is passed directly is its own installation,
+    named after the file. Directories are searched recursively; the
+    installation of a log file found in a directory is the path of its
+    subdirectory (e.g. 'room1/hanging2'), or the name of the file if it is
+    located in the directory itself.
+
+    Input:
+    - paths [list of str]: log files and/or directories
+    - pattern [str]: file name pattern of log files in directories
+
+    Output:
+    - logs [list of tuples]: (installation, logfile), sorted per directory
+
+    """
+
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for logfile in sorted(glob.glob(os.path.join(path, '**', pattern),
+                    recursive=True)):
+                subdir = os.path.relpath(os.path.dirname(logfile), path)
+                if subdir == '.':
+                    subdir = os.path.splitext(os.path.basename(logfile))[0]
+                logs.append((subdir.replace(os.sep, '/'), logfile))
+        else:
+            logs.append((os.path.splitext(os.path.basename(path))[0], path))
+
+    return logs
+
+def process_log(logfile, use_cache=True, profile=False, qc=None, **params):
+    """
+    Read and clean a single log file. Errors are returned instead of
+    raised, so that one bad file does not stop a batch.
+
+    Input:
+    - logfile [str]: path to the log file
+    - use_cache [bool]: read/store the result in the data cache, see
+      data_store.load_data (default = True)
+    - profile [bool]: measure the time and memory of the processing stages,
+      see read_data.data2df (default = False)
+    - qc [str]: run the quality control and 'flag', 'mask' or 'drop' the
+      flagged samples, see quality.apply_quality (default = None: no
+      quality control)
+    - params: keyword arguments passed to read_data.data2df
+
+    Output:
+    - df [pandas dataframe]: cleaned data, or None if processing failed
+    - error [str]: traceback of the error, or None
+    - report [dict]: time and memory per stage, or None if profile is False
+
+    """
+
+    report = {} if profile else None
+    try:
+        if use_cache:
+            df = data_store.load_data(logfile, profile=report, **params)
+        else:
+            df = read_data.data2df(logfile=logfile, profile=report, **params)
+        if qc is not None:
+            start = read_data.profile_start(report)
+            df = quality.apply_quality(df, qc,
+                schema=params.get('schema') or read_data.find_schema(logfile))
+            read_data.profile_stage(report, start, 'qc', len(df))
+    except Exception:
+        return None, traceback.format_exc(), report
+
+    return df, None, report
+
+def process_logs(logs, nprocs=None, use_cache=True, profiles=None, qc=None,
+        **params):
+    """
+    Read and clean a set of log files in parallel and combine the results
+    into a single dataframe, with the installation in the column
+    'installation'. Log files of the same installation are concatenated in
+    the order in which they are given.
+
+    Input:
+    - logs [list of tuples]: (installation, logfile), see find_logs
+    - nprocs [int]: number of worker processes (default = number of cores)
+    - use_cache [bool]: use the data cache (default = True)
+    - profiles [dict]: if given, the time and memory of the processing
+      stages of every log file are added to it, with the log file as key
+      (see process_log)
+    - qc [str]: quality control, see process_log (default = None)
+    - params: keyword arguments passed to read_data.data2df
+
+    Output:
+    - df [pandas dataframe]: combined data (None if all files failed)
+    - errors [dict]: traceback of the error per log file that failed
+
+    """
+
+    dfs = []
+    errors = {}
+    with ProcessPoolExecutor(max_workers=nprocs) as pool:
+        futures = [pool.submit(process_log, logfile, use_cache,
+            profiles is not None, qc, **params)
+            for installation, logfile in logs]
+
+        for (installation, logfile), future in zip(logs, futures):
+            # A worker that crashes completely raises here
+            try:
+                df, error, report = future.result()
+            except Exception:
+                df, error, report = None, traceback.format_exc(), None
+            if profiles is not None and report is not None:
+                report['installation'] = installation
+                profiles[logfile] = report
+
+            if error is not None:
+                errors[logfile] = error
+                continue
+            df.insert(0, 'installation', installation)
+            dfs.append(df)
+
+    if len(dfs) == 0:
+        return None, errors
+
+    return pd.concat(dfs, ignore_index=True), errors
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Read and clean log files '
+        'of one or more installations in parallel.')
+    parser.add_argument('paths', nargs='+',
+        help='log files and/or directories with log files')
+    parser.add_argument('--pattern', default='*.csv',
+        help='file name pattern of log files in directories (default: *.csv)')
+    parser.add_argument('--nprocs', type=int, default=None,
+        help='number of worker processes (default: number of cores)')
+    parser.add_argument('--no-correct', action='store_true',
+        help='do not correct for resets of the devices')
+    parser.add_argument('--tz', default=read_data.TIMEZONE,
+        help='time zone of the logger clocks, or "none" if the clocks do not '
+        'switch to summer time (default: %(default)s)')
+    parser.add_argument('--compact', action='store_true',
+        help='store the sensor columns as float32 and leave out the derived '
+        'columns, to save memory')
+    parser.add_argument('--qc', choices=('flag', 'mask', 'drop'),
+        default=None, help='flag spikes, stuck sensors and gaps (column qc), '
+        'and mask or drop the spikes and stuck values')
+    parser.add_argument('--no-cache', action='store_true',
+        help='do not use the data cache')
+    parser.add_argument('--output', default=None,
+        help='directory to write the combined data to (.npy per column)')
+    parser.add_argument('--profile', default=None,
+        help='write the time, number of rows and memory of every processing '
+        'stage per log file to this JSON file')
+    args = parser.parse_args(argv)
+
+    logs = find_logs(args.paths, args.pattern)
+    profiles = None if args.profile is None else {}
+    df, errors = process_logs(logs, nprocs=args.nprocs,
+        use_cache=not args.no_cache, profiles=profiles, qc=args.qc,
+        do_correct=not args.no_correct, compact=args.compact,
+        tz=None if args.tz.lower() == 'none' else args.tz)
+
+    for logfile, error in errors.items():
+        print('=== Failed:', logfile, '===', file=sys.stderr)
+        print(error, file=sys.stderr)
+
+    if df is not None:
+        print(df.groupby('installation', sort=False).size().to_string())
+        if args.output is not None:
+            data_store.write_columns(df, args.output)
+
+    if profiles is not None:
+        with open(args.profile, 'w') as f:
+            json.dump(profiles, f, indent=1)
+
+    print('Processed', len(logs) - len(errors), 'of', len(logs), 'log files')
+
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
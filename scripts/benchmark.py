@@ -0,0 +1,166 @@
+# Time and peak memory of the processing stages, on synthetic data
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+import read_data
+import synth_data
+import binning
+import rolling
+import fig7_mm
+
+def measure(func, *args, **kwargs):
+    """
+    Run a function and measure its wall time and peak memory allocation
+    (as traced by tracemalloc, which includes numpy and pandas arrays).
+    Tracing slows down code that allocates many small Python objects, so
+    the times are somewhat higher than without measuring the memory.
+
+    Input:
+    - func [function]: function to run
+    - args, kwargs: passed to func
+
+    Output:
+    - result: return value of func
+    - seconds [float]: wall time
+    - peak_mb [float]: peak of the memory allocated during the call (MB)
+
+    """
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, seconds, peak/2**20
+
+def bin_fig8(df):
+    """ RV binning as in fig8_40perc """
+
+    edges = binning.bin_edges(39.5, 80.5, 1.0)
+    return binning.binned_stats(df['RV_avg'], df[['hor_rel', 'ver_rel']],
+        edges, closed='neither')
+
+def roll_fig8(df):
+    """ Rolling windows as in fig8_40perc """
+
+    return rolling.rolling_stats(df['datetime'], df[['hor_rel', 'ver_rel']],
+        {'month': '30D', '6h': '6h'}, full_window=True)
+
+def render_fig7(df, outdir, do_decimate):
+    """ Render fig7 to a file """
+
+    fig7_mm.plotdir = outdir + os.sep
+    fig7_mm.overplot_temp_hum_stretch(df.reset_index(drop=True),
+        savefig=True, figname='fig7_bench.png', do_decimate=do_decimate,
+        show=False)
+    plt.close('all')
+
+def run_benchmark(ndays, nsensors=8, outdir=None, render=True, seed=0):
+    """
+    Generate a synthetic log and measure every stage of the processing.
+
+    Input:
+    - ndays [float]: length of the synthetic log (days, 30 minute samples)
+    - nsensors [int]: number of T/RV sensor pairs
+    - outdir [str]: directory for the log file and figures (default: a
+      temporary directory)
+    - render [bool]: include rendering of fig7 (default = True)
+    - seed [int]: seed of the random number generator
+
+    Output:
+    - report [dict]: number of rows, and per stage the wall time (s) and
+      the peak memory (MB)
+
+    """
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outdir = tmpdir if outdir is None else outdir
+        logfile = os.path.join(outdir, 'log_bench.csv')
+        synth_data.write_log(logfile, *synth_data.generate_data(ndays=ndays,
+            nsensors=nsensors, seed=seed))
+
+        report = {'ndays': ndays, 'nsensors': nsensors, 'stages': {}}
+        stages = report['stages']
+
+        (timestamps, values), *stages['parse'] = measure(read_data.parse_log,
+            logfile)
+        report['nrows'] = len(timestamps)
+        schema = synth_data.make_schema(nsensors)
+        (df, state), *stages['clean'] = measure(read_data.clean_data,
+            timestamps, values, schema=schema)
+        _, *stages['clean_compact'] = measure(read_data.clean_data,
+            timestamps, values, schema=schema, compact=True)
+        _, *stages['bin_fig8'] = measure(bin_fig8, df)
+        _, *stages['rolling_fig8'] = measure(roll_fig8, df)
+        if render:
+            _, *stages['render_fig7'] = measure(render_fig7, df, outdir,
+                False)
+            _, *stages['render_fig7_decimated'] = measure(render_fig7, df,
+                outdir, True)
+
+    report['stages'] = {stage: {'seconds': seconds, 'peak_mb': peak}
+        for stage, (seconds, peak) in stages.items()}
+
+    return report
+
+def print_report(reports):
+    """
+    Print a table with the time and peak memory per stage and size.
+
+    Input:
+    - reports [list of dicts]: output of run_benchmark
+
+    """
+
+    print('Stage'.ljust(24), 'Rows'.rjust(10), 'Time (s)'.rjust(10),
+        'Peak (MB)'.rjust(10))
+    for report in reports:
+        for stage, result in report['stages'].items():
+            print(stage.ljust(24), str(report['nrows']).rjust(10),
+                ('%.3f' % result['seconds']).rjust(10),
+                ('%.1f' % result['peak_mb']).rjust(10))
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Measure time and peak '
+        'memory of the processing stages on synthetic logs of several sizes.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+        help='sizes, in multiples of one year of 30 minute samples '
+        '(default: 1 10)')
+    parser.add_argument('--sensors', type=int, default=8,
+        help='number of T/RV sensor pairs (default: %(default)s)')
+    parser.add_argument('--no-render', action='store_true',
+        help='skip rendering fig7')
+    parser.add_argument('--json', default=None,
+        help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    reports = []
+    for scale in args.scales:
+        reports.append(run_benchmark(365*scale, nsensors=args.sensors,
+            render=not args.no_render))
+    print_report(reports)
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=1)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# Statistics of data binned on one variable (e.g. RV), computed in one pass
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import numpy as np
+import pandas as pd
+
+def bin_edges(lo, hi, width):
+    """
+    Edges of bins of equal width.
+
+    Input:
+    - lo [float]: lower edge of the first bin
+    - hi [float]: upper edge of the last bin
+    - width [float]: bin width
+
+    Output:
+    - edges [numpy array]: nbins+1 bin edges
+
+    """
+
+    nbins = int(round((hi - lo)/width))
+
+    return lo + width*np.arange(nbins + 1)
+
+def assign_bins(x, edges, closed='left'):
+    """
+    Find the bin of each value with a binary search.
+
+    Input:
+    - x [numpy array]: values to bin
+    - edges [numpy array]: increasing bin edges
+    - closed [str]: which edge belongs to a bin: 'left' ([lo, hi)),
+      'right' ((lo, hi]) or 'neither' ((lo, hi), values on an edge are not
+      assigned to any bin) (default = 'left')
+
+    Output:
+    - bins [numpy array]: bin index of each value, -1 if it is outside all
+      bins (or NaN)
+
+    """
+
+    x = np.asarray(x, dtype=float)
+    left = np.searchsorted(edges, x, side='left')
+    right = np.searchsorted(edges, x, side='right')
+
+    if closed == 'left':
+        bins = right - 1
+        outside = (right == 0) | (right == len(edges))
+    elif closed == 'right':
+        bins = left - 1
+        outside = (left == 0) | (left == len(edges))
+    elif closed == 'neither':
+        bins = left - 1
+        outside = (left != right) | (left == 0) | (left == len(edges))
+    else:
+        raise ValueError("closed should be 'left', 'right' or 'neither'")
+
+    bins[outside | np.isnan(x)] = -1
+
+    return bins
+
+def binned_stats(x, values, edges, quantiles=(), closed='left'):
+    """
+    Count, mean, (population) standard deviation and quantiles of one or
+    more columns in bins of x. The bins are assigned once; all statistics
+    of all columns are then computed with a few vectorized passes over the
+    data, without selecting the rows of each bin separately. NaN values are
+    ignored per column.
+
+    Input:
+    - x [numpy array or pandas series]: variable on which to bin
+    - values [pandas dataframe]: columns for which to compute statistics
+    - edges [numpy array]: increasing bin edges, see bin_edges
+    - quantiles [list of floats]: quantiles to compute, between 0 and 1
+    - closed [str]: which edge belongs to a bin, see assign_bins
+      (default = 'left')
+
+    Output:
+    - stats [pandas dataframe]: one row per bin, indexed by the bin centre,
+      with the columns 'lo' and 'hi' (bin edges) and per value column
+      '<col>_count', '<col>_mean', '<col>_std' and '<col>_q<100*q>'. Bins
+      without data have a count of 0 and NaN statistics.
+
+    """
+
+    edges = np.asarray(edges, dtype=float)
+    nbins = len(edges) - 1
+    bins = assign_bins(x, edges, closed)
+
+    stats = pd.DataFrame({'lo': edges[:-1], 'hi': edges[1:]},
+        index=0.5*(edges[:-1] + edges[1:]))
+
+    for col in values.columns:
+        v = np.asarray(values[col], dtype=float)
+        valid = (bins >= 0) & ~np.isnan(v)
+        b = bins[valid]
+        v = v[valid]
+
+        count = np.bincount(b, minlength=nbins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(b, weights=v, minlength=nbins)/count
+            var = np.bincount(b, weights=(v - mean[b])**2,
+                minlength=nbins)/count
+
+        stats[col + '_count'] = count
+        stats[col + '_mean'] = mean
+        stats[col + '_std'] = np.sqrt(var)
+
+        if len(quantiles) > 0:
+            # Sort by bin, then by value; each bin is then a contiguous
+            # sorted block, in which the quantiles are interpolated
+            order = np.lexsort((v, b))
+            v_sorted = v[order]
+            start = np.concatenate(([0], np.cumsum(count)[:-1]))
+            empty = count == 0
+            for q in quantiles:
+                pos = start + q*np.maximum(count - 1, 0)
+                lower = np.floor(pos).astype(int)
+                upper = np.ceil(pos).astype(int)
+                frac = pos - lower
+                if len(v_sorted) > 0:
+                    lower = np.minimum(lower, len(v_sorted) - 1)
+                    upper = np.minimum(upper, len(v_sorted) - 1)
+                    quant = v_sorted[lower]*(1 - frac) + v_sorted[upper]*frac
+                else:
+                    quant = np.zeros(nbins)
+                quant[empty] = np.nan
+                stats[col + '_q' + ('%g' % (100*q))] = quant
+
+    return stats
@@ -0,0 +1,262 @@
+# Block-bootstrap uncertainties of statistics of binned data
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import binning
+
+def block_samples(times, block):
+    """
+    Number of samples in a block of a given duration, from the median
+    sampling interval.
+
+    Input:
+    - times [pandas series or numpy array]: sorted datetimes
+    - block [str]: duration of a block, understood by pandas.Timedelta
+
+    Output:
+    - length [int]: number of samples (at least 1)
+
+    """
+
+    t = np.asarray(times).astype('datetime64[ns]').view(np.int64)
+    interval = np.median(np.diff(t)) if len(t) > 1 else 1
+
+    return max(int(round(pd.Timedelta(block).value/interval)), 1)
+
+def distinct_blocks(bins, values, nbins, times, block):
+    """
+    Number of distinct time windows of the duration of a block that hold
+    the (valid) samples of every bin. Samples within one window can end up
+    in a single bootstrap block, so a bin within one window does not vary
+    between replicates; how many windows a bin spans tells how well its
+    mean can be resolved.
+
+    Input:
+    - bins [numpy array]: bin of every sample, -1 for none
+    - values [numpy array]: values, shape (n, number of columns), NaN for
+      missing values
+    - nbins [int]: number of bins
+    - times [pandas series or numpy array]: datetimes of the samples
+    - block [str]: duration of a block, understood by pandas.Timedelta
+
+    Output:
+    - nblocks [numpy array]: number of windows, shape (nbins, number of
+      columns)
+
+    """
+
+    t = np.asarray(times).astype('datetime64[ns]').view(np.int64)
+    window = (t - t.min())//pd.Timedelta(block).value if len(t) else t
+    nwindows = int(window.max()) + 1 if len(t) else 1
+
+    nblocks = np.zeros((nbins, values.shape[1]), dtype=int)
+    for j in range(values.shape[1]):
+        ok = (bins >= 0) & ~np.isnan(values[:, j])
+        keys = np.unique(bins[ok].astype(np.int64)*nwindows + window[ok])
+        nblocks[:, j] = np.bincount(keys//nwindows, minlength=nbins)
+
+    return nblocks
+
+def block_indices(rng, n, length, nboot):
+    """
+    Sample positions of moving-block bootstrap replicates: every replicate
+    consists of blocks of consecutive samples at random positions, so that
+    the autocorrelation within a block is kept.
+
+    Input:
+    - rng [numpy Generator]: random number generator
+    - n [int]: number of samples
+    - length [int]: number of samples per block
+    - nboot [int]: number of replicates
+
+    Output:
+    - idx [numpy array]: positions, shape (nboot, n)
+
+    """
+
+    length = min(length, n)
+    nblocks = -(-n//length)
+    starts = rng.integers(0, n - length + 1, size=(nboot, nblocks))
+
+    return (starts[:, :, None] + np.arange(length)).reshape(nboot, -1)[:, :n]
+
+def replicate_means(bins, values, nbins, length, nboot, seed,
+        max_values=2**20):
+    """
+    Means per bin of block-bootstrap replicates of binned data. The
+    replicates are computed in batches: per batch a single bincount over
+    all replicates, with the replicate and the bin combined in one key.
+
+    Input:
+    - bins [numpy array]: bin of every sample, -1 for none (see
+      binning.assign_bins)
+    - values [numpy array]: values, shape (n, number of columns), NaN for
+      missing values
+    - nbins [int]: number of bins
+    - length [int]: number of samples per block
+    - nboot [int]: number of replicates
+    - seed: seed of the random number generator
+    - max_values [int]: largest number of resampled values per batch,
+      which limits the memory use (default = 2**20)
+
+    Output:
+    - means [numpy array]: means, shape (nboot, nbins, number of columns)
+
+    """
+
+    rng = np.random.default_rng(seed)
+    n, ncols = values.shape
+    means = np.empty((nboot, nbins, ncols))
+
+    # Samples outside all bins go to an extra bin, so that no masking is
+    # needed; NaN values get zero weight and are not counted
+    bins = np.where(bins >= 0, bins, nbins)
+    valid = ~np.isnan(values)
+    columns = [np.ascontiguousarray(np.where(valid[:, j], values[:, j], 0.0))
+        for j in range(ncols)]
+    weights = [None if valid[:, j].all() else valid[:, j].astype(float)
+        for j in range(ncols)]
+
+    batch = max(max_values//max(n, 1), 1)
+    for i in range(0, nboot, batch):
+        nrep = min(batch, nboot - i)
+        idx = block_indices(rng, n, length, nrep)
+        key = (np.arange(nrep)[:, None]*(nbins + 1) + bins[idx]).ravel()
+        size = nrep*(nbins + 1)
+        count_all = np.bincount(key, minlength=size)
+        for j in range(ncols):
+            total = np.bincount(key, weights=columns[j][idx].ravel(),
+                minlength=size)
+            count = count_all if weights[j] is None else np.bincount(key,
+                weights=weights[j][idx].ravel(), minlength=size)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[i:i + nrep, :, j] = (total/count).reshape(nrep,
+                    nbins + 1)[:, :nbins]
+
+    return means
+
+def bootstrap_means(x, values, edges, times, block='7D', nboot=2000,
+        closed='left', nprocs=1, seed=0, chunk=250, min_blocks=2):
+    """
+    Block-bootstrap replicates of the means of one or more columns in bins
+    of x (see binning.binned_stats). Resampling blocks of consecutive
+    samples instead of single samples keeps the autocorrelation of the
+    time series, which the standard deviation per bin ignores. The
+    replicates are divided in chunks with their own seeds, computed by
+    nprocs processes; the result does not depend on nprocs. A bin whose
+    (valid) samples lie in fewer than min_blocks time windows of the
+    duration of a block (see distinct_blocks) cannot be resolved: a few
+    blocks can hold all of them, so the replicates barely vary, or not at
+    all. Its means are NaN in every replicate.
+
+    Input:
+    - x [numpy array or pandas series]: variable on which to bin
+    - values [pandas dataframe]: columns of which to compute the means
+    - edges [numpy array]: increasing bin edges
+    - times [pandas series or numpy array]: datetimes of the samples, in
+      the order of the data
+    - block [str]: duration of a block (default = '7D')
+    - nboot [int]: number of replicates (default = 2000)
+    - closed [str]: which edge belongs to a bin, see binning.assign_bins
+    - nprocs [int]: number of worker processes (default = 1: no workers)
+    - seed [int]: seed of the random number generator (default = 0)
+    - chunk [int]: number of replicates per task (default = 250)
+    - min_blocks [int]: smallest number of windows per bin (default = 2)
+
+    Output:
+    - means [numpy array]: means per replicate, bin and column, shape
+      (nboot, number of bins, number of columns), NaN where a bin is empty
+      in a replicate or cannot be resolved
+
+    """
+
+    edges = np.asarray(edges, dtype=float)
+    bins = binning.assign_bins(x, edges, closed)
+    v = np.asarray(values, dtype=float)
+    length = block_samples(times, block)
+    nbins = len(edges) - 1
+
+    sizes = [min(chunk, nboot - i) for i in range(0, nboot, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(bins, v, nbins, length, size, task_seed)
+        for size, task_seed in zip(sizes, seeds)]
+
+    if nprocs == 1:
+        results = [replicate_means(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=nprocs) as pool:
+            results = list(pool.map(replicate_means, *zip(*tasks)))
+    means = np.concatenate(results)
+
+    nblocks = distinct_blocks(bins, v, nbins, times, block)
+    means[:, nblocks < min_blocks] = np.nan
+
+    return means
+
+def summarize(replicates, ci=0.95, min_valid=0.95):
+    """
+    Standard error and percentile confidence interval of bootstrapped
+    statistics. Replicates with a NaN (e.g. an empty bin) are counted and
+    left out; a statistic that is valid in less than a fraction min_valid
+    of the replicates is not resolved, and gets NaN.
+
+    Input:
+    - replicates [numpy array]: statistics per replicate (first axis)
+    - ci [float]: confidence level of the interval (default = 0.95)
+    - min_valid [float]: smallest fraction of valid replicates
+      (default = 0.95)
+
+    Output:
+    - se, lo, hi [numpy array]: standard error and interval per statistic
+    - nvalid [numpy array]: number of valid replicates per statistic
+
+    """
+
+    nvalid = np.sum(~np.isnan(replicates), axis=0)
+    resolved = nvalid >= max(min_valid*len(replicates), 2)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        se = np.nanstd(replicates, axis=0, ddof=1)
+        lo, hi = np.nanpercentile(replicates, [50*(1 - ci), 50*(1 + ci)],
+            axis=0)
+
+    return (np.where(resolved, se, np.nan), np.where(resolved, lo, np.nan),
+        np.where(resolved, hi, np.nan), nvalid)
+
+def binned_uncertainty(x, values, edges, times, ci=0.95, closed='left',
+        **kwargs):
+    """
+    Binned statistics (see binning.binned_stats) with block-bootstrap
+    standard errors and confidence intervals of the means.
+
+    Input:
+    - x, values, edges, closed: see binning.binned_stats
+    - times [pandas series or numpy array]: datetimes of the samples
+    - ci [float]: confidence level of the intervals (default = 0.95)
+    - kwargs: passed to bootstrap_means (block, nboot, nprocs, seed,
+      min_blocks)
+
+    Output:
+    - stats [pandas dataframe]: the output of binning.binned_stats, with
+      per column also '<col>_mean_se', '<col>_mean_lo' and '<col>_mean_hi'
+      (NaN for bins that cannot be resolved, see summarize and
+      bootstrap_means) and '<col>_mean_nvalid', the number of replicates
+      in which the bin is valid
+    - means [numpy array]: the replicates, see bootstrap_means
+
+    """
+
+    stats = binning.binned_stats(x, values, edges, closed=closed)
+    means = bootstrap_means(x, values, edges, times, closed=closed, **kwargs)
+    se, lo, hi, nvalid = summarize(means, ci)
+    for j, col in enumerate(values.columns):
+        stats[col + '_mean_se'] = se[:, j]
+        stats[col + '_mean_lo'] = lo[:, j]
+        stats[col + '_mean_hi'] = hi[:, j]
+        stats[col + '_mean_nvalid'] = nvalid[:, j]
+
+    return stats, means
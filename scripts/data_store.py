@@ -0,0 +1,580 @@
+# Store cleaned data on disk, so that it is parsed and cleaned only once
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import io
+import os
+import sys
+import json
+import shutil
+import hashlib
+import inspect
+import argparse
+import numpy as np
+import pandas as pd
+import read_data
+
+CACHEDIR = '../data/cache/'
+STOREDIR = '../data/store/'
+
+def file_hash(filename, blocksize=2**20):
+    """
+    Compute the SHA-256 hash of the contents of a file.
+
+    Input:
+    - filename [str]: path to the file
+    - blocksize [int]: number of bytes read at once
+
+    Output:
+    - hash [str]: hexadecimal hash
+
+    """
+
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+def data2df_params(**params):
+    """
+    Complete the keyword arguments of read_data.data2df with their default
+    values, leaving out the ones that do not change the output.
+
+    Input:
+    - params: keyword arguments passed to data2df
+
+    Output:
+    - params [dict]
+
+    """
+
+    bound = inspect.signature(read_data.data2df).bind(**params)
+    bound.apply_defaults()
+    params = dict(bound.arguments)
+    for name in ('logfile', 'be_verbose', 'profile'):
+        params.pop(name, None)
+
+    return params
+
+def params_tag(**params):
+    """
+    Short tag that identifies the keyword arguments of read_data.data2df.
+
+    Input:
+    - params: keyword arguments passed to data2df
+
+    Output:
+    - tag [str]
+
+    """
+
+    info = json.dumps(data2df_params(**params), sort_keys=True, default=str)
+
+    return hashlib.sha256(info.encode()).hexdigest()[:8]
+
+def path_tag(logfile):
+    """
+    Short tag that identifies the location of a log file, so that log files
+    of different installations with the same name are kept apart.
+
+    Input:
+    - logfile [str]: path to the log file
+
+    Output:
+    - tag [str]
+
+    """
+
+    path = os.path.realpath(logfile)
+
+    return hashlib.sha256(path.encode()).hexdigest()[:8]
+
+def cleaning_params(**params):
+    """
+    Collect everything that determines the outcome of read_data.data2df:
+    the keyword arguments, the contents of the schema, the cleaning
+    constants and the source code of read_data itself.
+
+    Input:
+    - params: keyword arguments passed to data2df
+
+    Output:
+    - cleaning_params [dict]
+
+    """
+
+    schema = params.get('schema')
+    if schema is None:
+        schema = read_data.find_schema(params.get('logfile',
+            read_data.LOGFILE))
+    params = data2df_params(**params)
+    constants = {name: getattr(read_data, name) for name in dir(read_data)
+        if name.isupper() and name not in ('LOGFILE', 'SCHEMA')}
+
+    return {'params': params, 'schema': read_data.load_schema(schema),
+        'constants': constants, 'code': file_hash(read_data.__file__)}
+
+def cache_key(logfile, **params):
+    """
+    Key of the cached data: combines the contents of the log file with the
+    cleaning parameters.
+
+    Input:
+    - logfile [str]: path to the log file
+    - params: keyword arguments passed to data2df
+
+    Output:
+    - key [str]
+
+    """
+
+    info = json.dumps({'logfile': file_hash(logfile),
+        'cleaning': cleaning_params(logfile=logfile, **params)},
+        sort_keys=True, default=str)
+
+    return hashlib.sha256(info.encode()).hexdigest()[:16]
+
+def write_columns(df, dirname):
+    """
+    Write a dataframe to a directory with one .npy file per column.
+    Datetime columns are stored as int64 nanoseconds, string columns as
+    fixed width unicode.
+
+    Input:
+    - df [pandas dataframe]: dataframe to store
+    - dirname [str]: directory to write to (created or overwritten)
+
+    """
+
+    # Write into a temporary directory first, so that an interrupted write
+    # never leaves a partial directory behind
+    tmpdir = dirname.rstrip('/') + '.tmp'
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    os.makedirs(tmpdir)
+
+    columns = []
+    for i, col in enumerate(['index'] + list(df.columns)):
+        values = df.index.values if col == 'index' else df[col].values
+        if values.dtype.kind == 'M':
+            kind = 'datetime'
+            values = values.astype('datetime64[ns]').view(np.int64)
+        elif values.dtype.kind == 'O':
+            kind = 'str'
+            values = values.astype(str)
+        else:
+            kind = 'num'
+        np.save(os.path.join(tmpdir, 'col%03d.npy' % i), values)
+        columns.append([col, kind])
+
+    with open(os.path.join(tmpdir, 'columns.json'), 'w') as f:
+        json.dump(columns, f)
+
+    shutil.rmtree(dirname, ignore_errors=True)
+    os.replace(tmpdir, dirname)
+
+def append_npy(filename, values):
+    """
+    Append values to a one-dimensional array stored in a .npy file. Only the
+    header and the new values are written. np.save leaves room in the
+    header for the length to grow to any int64, so the header only grows
+    for files that were not written by np.save. In that case, for files in
+    format version 2.0, or if the values do not fit the stored data type
+    (e.g. longer strings), the whole array is loaded into memory and the
+    file is rewritten.
+
+    Input:
+    - filename [str]: path to the .npy file
+    - values [numpy array]: values to append
+
+    """
+
+    with open(filename, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        header_len = f.tell()
+
+        new_values = values.astype(dtype)
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {'descr':
+            np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+            'shape': (shape[0] + len(values),)})
+
+        if (header.tell() == header_len and version == (1, 0) and
+                np.can_cast(values.dtype, dtype, casting='same_kind') and
+                (values.dtype.kind != 'U' or values.dtype.itemsize <=
+                    dtype.itemsize)):
+            f.seek(0)
+            f.write(header.getvalue())
+            f.seek(0, os.SEEK_END)
+            f.write(new_values.tobytes())
+            return
+
+    old = np.load(filename)
+    np.save(filename, np.concatenate((old, values)))
+
+def append_columns(df, dirname):
+    """
+    Append the rows of a dataframe to columns that were written with
+    write_columns. The dataframe must have the same columns.
+
+    Input:
+    - df [pandas dataframe]: rows to append
+    - dirname [str]: directory containing the columns
+
+    """
+
+    with open(os.path.join(dirname, 'columns.json')) as f:
+        columns = json.load(f)
+
+    for i, (col, kind) in enumerate(columns):
+        values = df.index.values if col == 'index' else df[col].values
+        if kind == 'datetime':
+            values = values.astype('datetime64[ns]').view(np.int64)
+        elif kind == 'str':
+            values = values.astype(str)
+        append_npy(os.path.join(dirname, 'col%03d.npy' % i), values)
+
+def read_columns(dirname, mmap=True):
+    """
+    Read a dataframe that was written with write_columns. The columns are
+    not combined into blocks, so that memory mapped columns are used as
+    they are instead of being copied.
+
+    Input:
+    - dirname [str]: directory containing the columns
+    - mmap [bool]: if True, memory map the numeric and datetime columns
+      instead of reading them, so that only the parts that are used are
+      read from disk (default = True). The mapping is copy-on-write:
+      changing the dataframe does not change the files. String columns
+      are always read.
+
+    Output:
+    - df [pandas dataframe]
+
+    """
+
+    with open(os.path.join(dirname, 'columns.json')) as f:
+        columns = json.load(f)
+
+    data = {}
+    for i, (col, kind) in enumerate(columns):
+        values = np.load(os.path.join(dirname, 'col%03d.npy' % i),
+            mmap_mode='c' if mmap else None)
+        if kind == 'datetime':
+            values = values.view('datetime64[ns]')
+        elif kind == 'str':
+            values = values.astype(object)
+        data[col] = values
+
+    index = data.pop('index')
+
+    return pd.DataFrame(data, index=index, copy=False)
+
+def cache_dir(logfile=read_data.LOGFILE, cachedir=CACHEDIR, **params):
+    """
+    Directory of the cached data of a log file, see load_data. Derived data
+    (e.g. an index of the data) can be stored in a subdirectory; it is
+    removed together with the cached data when that becomes outdated.
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - cachedir [str]: directory holding the cache (default = CACHEDIR)
+    - params: keyword arguments passed to read_data.data2df
+
+    Output:
+    - prefix [str]: start of the names of all cached versions of the log
+      file (at this location) with these parameters
+    - dirname [str]
+
+    """
+
+    prefix = os.path.splitext(os.path.basename(logfile))[0] + '_' + \
+        path_tag(logfile) + '_' + params_tag(**params) + '_'
+
+    return prefix, os.path.join(cachedir, prefix + cache_key(logfile,
+        **params))
+
+def load_data(logfile=read_data.LOGFILE, cachedir=CACHEDIR, **params):
+    """
+    Cached version of read_data.data2df. The cleaned data is read from the
+    cache if the log file, the parameters, the cleaning constants and the
+    cleaning code are all unchanged; otherwise the log file is processed
+    and the result is stored in the cache. Outdated cached versions of the
+    same log file are removed.
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - cachedir [str]: directory holding the cache (default = CACHEDIR)
+    - params: keyword arguments passed to read_data.data2df. With
+      be_verbose=True the cache is bypassed, so that the checks are printed.
+      With profile, the report also holds the stage 'cache_read' or
+      'cache_write', and profile['cached'] tells whether the data was read
+      from the cache.
+
+    Output:
+    - df [pandas dataframe]: dataframe with leather displacement data
+
+    """
+
+    if params.get('be_verbose', False):
+        return read_data.data2df(logfile=logfile, **params)
+
+    profile = params.get('profile')
+    prefix, dirname = cache_dir(logfile, cachedir, **params)
+
+    if os.path.isfile(os.path.join(dirname, 'columns.json')):
+        if profile is not None:
+            profile.update({'logfile': logfile, 'cached': True,
+                'stages': []})
+        start = read_data.profile_start(profile)
+        df = read_columns(dirname)
+        read_data.profile_stage(profile, start, 'cache_read', len(df))
+        return df
+
+    df = read_data.data2df(logfile=logfile, **params)
+    start = read_data.profile_start(profile)
+    if profile is not None:
+        profile['cached'] = False
+
+    # Remove outdated versions (same log file and parameters)
+    if os.path.isdir(cachedir):
+        for entry in os.listdir(cachedir):
+            if entry.startswith(prefix):
+                shutil.rmtree(os.path.join(cachedir, entry),
+                    ignore_errors=True)
+    write_columns(df, dirname)
+    read_data.profile_stage(profile, start, 'cache_write', len(df))
+
+    return df
+
+def store_dir(logfile=read_data.LOGFILE, storedir=STOREDIR, **params):
+    """
+    Directory of the incrementally updated data of a log file, see
+    update_data. Read the data with read_columns.
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - storedir [str]: directory holding the stores (default = STOREDIR)
+    - params: keyword arguments passed to read_data.data2df
+
+    Output:
+    - dirname [str]
+
+    """
+
+    return os.path.join(storedir, os.path.splitext(os.path.basename(
+        logfile))[0] + '_' + path_tag(logfile) + '_' + params_tag(**params))
+
+def update_data(logfile=read_data.LOGFILE, storedir=STOREDIR, **params):
+    """
+    Bring the cleaned data of a log file that is still being written to up
+    to date. Only the lines added since the previous update are read and
+    cleaned (read_data.clean_data, continuing from the saved cleaning
+    state), and the resulting rows are appended to the stored data. The
+    data is processed from the start if it has not been stored yet, if the
+    cleaning parameters, constants or code changed, or if the last line
+    that was read before has changed. The log file is assumed to only grow
+    at the end; changes elsewhere in the part that was already read are
+    not detected.
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - storedir [str]: directory holding the stores (default = STOREDIR)
+    - params: keyword arguments passed to read_data.clean_data
+
+    Output:
+    - df [pandas dataframe]: the rows that were added, or None if there were
+      no new (complete) lines
+
+    """
+
+    dirname = store_dir(logfile, storedir, **params)
+    statefile = os.path.join(dirname, 'state.json')
+    cleaning = json.loads(json.dumps(cleaning_params(logfile=logfile,
+        **params), default=str))
+    if params.get('schema') is None:
+        params['schema'] = read_data.find_schema(logfile)
+
+    info = None
+    if os.path.isfile(statefile):
+        with open(statefile) as f:
+            info = json.load(f)
+
+    with open(logfile, 'rb') as f:
+        # Check that the part that was read before did not change, by
+        # comparing the last line that was read
+        if info is not None and info['cleaning'] == cleaning:
+            tail = info['tail'].encode('latin-1')
+            f.seek(max(info['offset'] - len(tail), 0))
+            if f.read(len(tail)) != tail:
+                info = None
+        else:
+            info = None
+
+        offset = 0 if info is None else info['offset']
+        f.seek(offset)
+        raw = f.read()
+
+    # Only read complete lines; the logger may be writing the last one
+    raw = raw[:raw.rfind(b'\n') + 1]
+    nlines = raw.count(b'\n')
+    if nlines == 0:
+        return None
+    if (info is None and params.get('do_correct', True) and
+            nlines <= read_data.NDROP + read_data.MIDNIGHT_ROW):
+        # Not enough data yet to determine the baseline
+        return None
+
+    timestamps, values = read_data.parse_log_bytes(raw)
+    df, state = read_data.clean_data(timestamps, values,
+        None if info is None else info['state'], **params)
+
+    if info is None:
+        os.makedirs(storedir, exist_ok=True)
+        write_columns(df, dirname)
+    else:
+        append_columns(df, dirname)
+
+    write_state(dirname, offset + len(raw), raw, cleaning, state)
+
+    return df
+
+def write_state(dirname, offset, raw, cleaning, state):
+    """
+    Save the information needed to continue processing a log file in the
+    file state.json of a store, see update_data.
+
+    Input:
+    - dirname [str]: directory of the store
+    - offset [int]: number of bytes of the log file that were processed
+    - raw [bytes]: the last lines that were processed
+    - cleaning [dict]: cleaning parameters, see cleaning_params
+    - state [dict]: cleaning state, see read_data.clean_data
+
+    """
+
+    statefile = os.path.join(dirname, 'state.json')
+    tail = raw[raw.rfind(b'\n', 0, len(raw) - 1) + 1:]
+    info = {'offset': offset, 'tail': tail.decode('latin-1'),
+        'cleaning': cleaning, 'state': state}
+    with open(statefile + '.tmp', 'w') as f:
+        json.dump(info, f)
+    os.replace(statefile + '.tmp', statefile)
+
+def stream_data(logfile=read_data.LOGFILE, storedir=STOREDIR, chunksize=2**26,
+        **params):
+    """
+    Process a log file that does not fit in memory. The file is read,
+    parsed and cleaned in blocks of about chunksize bytes, carrying the
+    cleaning state (previous sample, resets, summer time) from one block to
+    the next, and the rows of every block are appended to the stored data.
+    The memory use depends on chunksize, not on the length of the log. The
+    result is the same as that of update_data, which can be used to bring
+    it up to date later on; read it with read_columns, which memory maps the
+    numeric and datetime columns (the string column datetime_raw is read
+    into memory; compact=True leaves it out). As with update_data, an
+    incomplete last line is not read.
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - storedir [str]: directory holding the stores (default = STOREDIR)
+    - chunksize [int]: number of bytes read at once (default = 64 MB)
+    - params: keyword arguments passed to read_data.clean_data, e.g.
+      compact=True
+
+    Output:
+    - dirname [str]: directory of the stored data
+    - nrows [int]: number of rows stored
+
+    """
+
+    dirname = store_dir(logfile, storedir, **params)
+    cleaning = json.loads(json.dumps(cleaning_params(logfile=logfile,
+        **params), default=str))
+    if params.get('schema') is None:
+        params['schema'] = read_data.find_schema(logfile)
+    minlines = read_data.NDROP + read_data.MIDNIGHT_ROW + 1 \
+        if params.get('do_correct', True) else 1
+
+    # Write into a separate directory, which replaces the store when done
+    partdir = dirname.rstrip('/') + '.part'
+    shutil.rmtree(partdir, ignore_errors=True)
+    os.makedirs(storedir, exist_ok=True)
+
+    state = None
+    offset = 0
+    nrows = 0
+    pending = b''
+    with open(logfile, 'rb') as f:
+        while True:
+            block = f.read(chunksize)
+            raw = pending + block
+            end = raw.rfind(b'\n') + 1
+
+            # The first block needs enough lines to determine the baseline
+            if block and state is None and raw.count(b'\n', 0, end) < \
+                    minlines:
+                pending = raw
+                continue
+
+            raw, pending = raw[:end], raw[end:]
+            timestamps, values = read_data.parse_log_bytes(raw)
+            if len(timestamps) > 0:
+                df, state = read_data.clean_data(timestamps, values, state,
+                    **params)
+                if os.path.isdir(partdir):
+                    append_columns(df, partdir)
+                else:
+                    write_columns(df, partdir)
+                nrows += len(df)
+                offset += len(raw)
+                last = raw
+
+            if not block:
+                break
+
+    if state is None:
+        raise ValueError('No complete lines in ' + logfile)
+
+    write_state(partdir, offset, last, cleaning, state)
+    shutil.rmtree(dirname, ignore_errors=True)
+    os.replace(partdir, dirname)
+
+    return dirname, nrows
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Clean a log file in blocks '
+        'and store the result on disk (.npy per column), with a memory use '
+        'that does not depend on the length of the log.')
+    parser.add_argument('logfile', nargs='?', default=read_data.LOGFILE,
+        help='log file (default: %(default)s)')
+    parser.add_argument('--storedir', default=STOREDIR,
+        help='directory holding the stores (default: %(default)s)')
+    parser.add_argument('--chunk-mb', type=float, default=64,
+        help='size of the blocks read at once in MB (default: %(default)s)')
+    parser.add_argument('--no-correct', action='store_true',
+        help='do not correct for resets of the devices')
+    parser.add_argument('--tz', default=read_data.TIMEZONE,
+        help='time zone of the logger clock, or "none" if the clock does not '
+        'switch to summer time (default: %(default)s)')
+    parser.add_argument('--compact', action='store_true',
+        help='store the sensor columns as float32 and leave out the derived '
+        'columns')
+    args = parser.parse_args(argv)
+
+    dirname, nrows = stream_data(args.logfile, args.storedir,
+        chunksize=int(args.chunk_mb*2**20), do_correct=not args.no_correct,
+        tz=None if args.tz.lower() == 'none' else args.tz,
+        compact=args.compact)
+    print('Stored', nrows, 'rows in', dirname)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# Reduce dense time series to about one point per pixel before plotting
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import numpy as np
+
+def minmax_indices(x, y, nbins):
+    """
+    Select the samples to plot of a dense series: divide the range of x into
+    nbins bins of equal width (e.g. one per pixel) and keep the samples with
+    the minimum and the maximum y value in each bin, as well as the first
+    and the last sample. A line or markers through these samples looks the
+    same as through all samples, peaks and jumps included. NaN values of y
+    are skipped.
+
+    Input:
+    - x [numpy array]: x values (e.g. days_diff)
+    - y [numpy array]: y values
+    - nbins [int]: number of bins, e.g. the width of the axes in pixels
+
+    Output:
+    - idx [numpy array]: sorted indices of the samples to keep
+
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    if len(valid) <= 2*nbins:
+        return valid
+
+    xv = x[valid]
+    lo, hi = np.min(xv), np.max(xv)
+    bins = np.minimum(((xv - lo)/(hi - lo)*nbins).astype(int), nbins - 1) \
+        if hi > lo else np.zeros(len(xv), dtype=int)
+
+    # Sort by bin, then by y: the first sample of each bin has the minimum,
+    # the last one the maximum
+    order = np.lexsort((y[valid], bins))
+    sorted_bins = bins[order]
+    first = np.flatnonzero(np.diff(sorted_bins, prepend=-1) != 0)
+    last = np.flatnonzero(np.diff(sorted_bins, append=nbins) != 0)
+
+    keep = np.concatenate((order[first], order[last], [0, len(valid) - 1]))
+
+    return valid[np.unique(keep)]
+
+def axes_width_pixels(ax, dpi=None):
+    """
+    Width of a matplotlib axes in pixels.
+
+    Input:
+    - ax [matplotlib axes]
+    - dpi [float]: resolution, e.g. the one used with savefig; if None, the
+      resolution of the figure (default = None)
+
+    Output:
+    - width [int]
+
+    """
+
+    fig = ax.get_figure()
+    if dpi is None:
+        dpi = fig.dpi
+
+    return int(np.ceil(ax.get_position().width*fig.get_figwidth()*dpi))
+
+def plot_decimated(ax, x, y, npixels=None, dpi=None, **kwargs):
+    """
+    Plot a dense series with ax.plot, reduced with minmax_indices to about
+    two samples per pixel. Call this after the layout of the figure is set
+    (figure size, subplots), so that the width of the axes is known.
+
+    Input:
+    - ax [matplotlib axes]: axes to plot in
+    - x, y [pandas series or numpy arrays]: data to plot
+    - npixels [int]: number of bins; if None, the width of the axes in
+      pixels (default = None)
+    - dpi [float]: resolution used to compute the width of the axes, see
+      axes_width_pixels (default = None)
+    - kwargs: passed to ax.plot
+
+    Output:
+    - lines [list]: lines returned by ax.plot
+
+    """
+
+    if npixels is None:
+        npixels = axes_width_pixels(ax, dpi)
+    x = np.asarray(x)
+    y = np.asarray(y)
+    idx = minmax_indices(x, y, npixels)
+
+    return ax.plot(x[idx], y[idx], **kwargs)
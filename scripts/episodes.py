@@ -0,0 +1,295 @@
+# Index of the rises and falls of the relative humidity (hysteresis cycles)
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import read_data
+import data_store
+
+def turning_points(x, threshold):
+    """
+    Turning points of a series with a hysteresis threshold: a maximum is a
+    turning point once the series has fallen at least threshold below it,
+    a minimum once it has risen at least threshold above it. Smaller
+    wiggles are ignored. The candidates, the local extremes (of runs of
+    equal values the first sample), are found vectorised; only these are
+    passed through the hysteresis.
+
+    Input:
+    - x [numpy array]: series without NaN values
+    - threshold [float]: smallest rise or fall between turning points
+
+    Output:
+    - turns [numpy array]: positions of the turning points, ending with the
+      last extreme, which is not confirmed by a reversal yet. The samples
+      before the first turning point are not part of an episode.
+
+    """
+
+    if len(x) < 2:
+        return np.zeros(0, dtype=int)
+
+    runs = np.concatenate(([0], np.flatnonzero(np.diff(x)) + 1))
+    slope = np.sign(np.diff(x[runs]))
+    extremes = np.concatenate(([0], np.flatnonzero(slope[1:] != slope[:-1])
+        + 1, [len(runs) - 1]))
+    candidates = runs[np.unique(extremes)]
+    values = x[candidates].tolist()
+
+    # Before the first turning point the direction is not known: track both
+    # the highest and the lowest value
+    turns = []
+    trend = 0
+    high = low = extreme = 0
+    for k in range(1, len(values)):
+        v = values[k]
+        if trend == 0:
+            if v > values[high]:
+                high = k
+            if v < values[low]:
+                low = k
+            if values[high] - values[low] >= threshold:
+                trend = 1 if high > low else -1
+                first, extreme = (low, high) if trend == 1 else (high, low)
+                turns.append(first)
+        elif trend == 1:
+            if v > values[extreme]:
+                extreme = k
+            elif values[extreme] - v >= threshold:
+                turns.append(extreme)
+                trend = -1
+                extreme = k
+        else:
+            if v < values[extreme]:
+                extreme = k
+            elif v - values[extreme] >= threshold:
+                turns.append(extreme)
+                trend = 1
+                extreme = k
+    if trend != 0 and extreme > turns[-1]:
+        turns.append(extreme)
+
+    return candidates[np.array(turns, dtype=int)]
+
+def segment_argext(y, starts, ends, maximum):
+    """
+    Position of the maximum or minimum of y in every segment [start, end],
+    the first one if it occurs more than once, with numpy reduceat.
+
+    Input:
+    - y [numpy array]: values without NaN
+    - starts, ends [numpy array]: first and last position of the segments
+    - maximum [numpy array]: per segment True for the maximum, False for
+      the minimum
+
+    Output:
+    - positions [numpy array]
+
+    """
+
+    if len(starts) == 0:
+        return np.zeros(0, dtype=int)
+
+    # Segments may overlap (at their ends), so they are laid out one after
+    # the other
+    lengths = ends - starts + 1
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    idx = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+    sign = np.repeat(np.where(maximum, 1.0, -1.0), lengths)
+    values = sign*y[idx]
+
+    best = np.maximum.reduceat(values, offsets)
+    is_best = values == np.repeat(best, lengths)
+    first = np.minimum.reduceat(np.where(is_best, np.arange(len(idx)),
+        len(idx)), offsets)
+
+    return idx[first]
+
+def loop_areas(x, y, starts, ends):
+    """
+    Area enclosed by the path of (x, y) from start to end, closed by a
+    straight line back to the start, with the shoelace formula on
+    cumulative sums. The area is positive if the path runs anticlockwise,
+    e.g. when y lags behind x in a rise followed by a fall, and does not
+    depend on the offset of x or y.
+
+    Input:
+    - x, y [numpy array]: values without NaN
+    - starts, ends [numpy array]: first and last position of the paths
+
+    Output:
+    - areas [numpy array]
+
+    """
+
+    if len(starts) == 0:
+        return np.zeros(0)
+
+    x = x - np.mean(x)
+    y = y - np.mean(y)
+    cross = np.concatenate(([0.0], np.cumsum(x[:-1]*y[1:] - x[1:]*y[:-1])))
+
+    return 0.5*(cross[ends] - cross[starts] + x[ends]*y[starts] -
+        x[starts]*y[ends])
+
+def episode_index(df, threshold=2.0, x='RV_avg', ys=('ver_rel', 'hor_rel')):
+    """
+    Split the time series into episodes in which the relative humidity
+    rises (adsorption) or falls (desorption) by at least threshold, between
+    turning points with hysteresis (see turning_points), and describe
+    every episode with a row of an index. Queries over many cycles can
+    then use the index instead of the series.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+    - threshold [float]: smallest rise or fall of x (default = 2.0 %)
+    - x [str]: driving quantity (default = 'RV_avg')
+    - ys [list of str]: responding quantities
+
+    Output:
+    - episodes [pandas dataframe]: one row per episode with the positions
+      of the first and last sample in df ('start_row', 'end_row', usable
+      with iloc), the start and end time, the 'direction' (1 for a rise, -1
+      for a fall), the duration in hours, the value of x at the start and
+      the change of x and of every y ('d_<x>', 'd_<y>'), per y the time in
+      hours from the turning point of x at the end of the episode to the
+      turning point of y that follows ('<y>_lag_h': to the maximum of y
+      after a rise, the minimum after a fall, as y expands with x), the
+      area of the path of (x, y) closed by its chord ('<y>_area') and the
+      area of the loop formed with the next episode ('<y>_loop', see
+      loop_areas), and whether the episode ended with a confirmed reversal
+      ('complete')
+
+    """
+
+    ys = list(ys)
+    values = df[[x] + ys].values.astype(float)
+    rows = np.flatnonzero(~np.isnan(values).any(axis=1))
+    values = values[rows]
+    t = df['datetime'].values.astype('datetime64[ns]')[rows]
+    turns = turning_points(values[:, 0], threshold)
+    if len(turns) == 0:
+        turns = np.zeros(1, dtype=int)
+
+    starts, ends = turns[:-1], turns[1:]
+    rise = values[ends, 0] > values[starts, 0]
+    hour = np.timedelta64(1, 'h')
+    episodes = pd.DataFrame({'start_row': rows[starts], 'end_row': rows[ends],
+        'start': t[starts], 'end': t[ends],
+        'direction': np.where(rise, 1, -1).astype(np.int8),
+        'duration_h': (t[ends] - t[starts])/hour,
+        x + '_start': values[starts, 0],
+        'd_' + x: values[ends, 0] - values[starts, 0]})
+
+    # The response to an episode continues after the turning point of x, up
+    # to the next turning point (or the end of the data)
+    after = np.append(turns[2:], len(values) - 1)
+    for j, y in enumerate(ys, start=1):
+        episodes['d_' + y] = values[ends, j] - values[starts, j]
+        peak = segment_argext(values[:, j], ends, after, rise)
+        episodes[y + '_lag_h'] = (t[peak] - t[ends])/hour
+        episodes[y + '_area'] = loop_areas(values[:, 0], values[:, j], starts,
+            ends)
+        loops = loop_areas(values[:, 0], values[:, j], starts[:-1], ends[1:])
+        episodes[y + '_loop'] = np.append(loops, np.nan)[:len(starts)]
+
+    complete = np.ones(len(starts), dtype=bool)
+    complete[-1:] = False
+    episodes['complete'] = complete
+
+    return episodes
+
+def episodes_by_installation(df, **kwargs):
+    """
+    Run episode_index for every installation in combined data (see
+    batch.process_logs). The row positions refer to the rows of each
+    installation.
+
+    Input:
+    - df [pandas dataframe]: data with an 'installation' column
+    - kwargs: passed to episode_index
+
+    Output:
+    - episodes [pandas dataframe]: index with an 'installation' column
+
+    """
+
+    results = []
+    for installation, group in df.groupby('installation', sort=False):
+        result = episode_index(group, **kwargs)
+        result.insert(0, 'installation', installation)
+        results.append(result)
+
+    return pd.concat(results, ignore_index=True)
+
+def load_episodes(logfile=read_data.LOGFILE, threshold=2.0, x='RV_avg',
+        ys=('ver_rel', 'hor_rel'), cachedir=data_store.CACHEDIR, **params):
+    """
+    Episode index of a log file, stored next to the cached cleaned data
+    (see data_store.load_data), so that it is computed only once. It is
+    removed together with the cached data when that becomes outdated, and
+    recomputed when episodes.py changes.
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - threshold, x, ys: see episode_index
+    - cachedir [str]: directory holding the cache
+    - params: keyword arguments passed to read_data.data2df
+
+    Output:
+    - episodes [pandas dataframe]: see episode_index
+
+    """
+
+    df = data_store.load_data(logfile, cachedir, **params)
+    args = json.dumps({'threshold': threshold, 'x': x, 'ys': list(ys)},
+        sort_keys=True)
+    prefix = 'episodes_' + hashlib.sha256(args.encode()).hexdigest()[:8] + '_'
+    datadir = data_store.cache_dir(logfile, cachedir, **params)[1]
+    dirname = os.path.join(datadir, prefix + data_store.file_hash(
+        __file__)[:8])
+    if os.path.isfile(os.path.join(dirname, 'columns.json')):
+        return data_store.read_columns(dirname, mmap=False)
+
+    # Remove versions of an older episodes.py (same arguments)
+    for entry in os.listdir(datadir):
+        if entry.startswith(prefix):
+            shutil.rmtree(os.path.join(datadir, entry), ignore_errors=True)
+    episodes = episode_index(df, threshold, x, ys)
+    data_store.write_columns(episodes, dirname)
+
+    return episodes
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Index of the rises and '
+        'falls of the relative humidity and the response of the leather.')
+    parser.add_argument('logfile', nargs='?', default=read_data.LOGFILE,
+        help='log file (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=2.0,
+        help='smallest rise or fall of the relative humidity in %% '
+        '(default: %(default)s)')
+    parser.add_argument('--output', default=None,
+        help='also write the index to this .csv file')
+    args = parser.parse_args(argv)
+
+    episodes = load_episodes(args.logfile, args.threshold, do_correct=True,
+        compact=True)
+    print(episodes.groupby('direction')[['duration_h', 'd_RV_avg',
+        'd_ver_rel', 'd_hor_rel', 'ver_rel_lag_h', 'hor_rel_lag_h']].median()
+        .round(2).to_string())
+    print(len(episodes), 'episodes')
+    if args.output is not None:
+        episodes.to_csv(args.output, index=False)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
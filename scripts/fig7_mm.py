@@ -1,11 +1,13 @@
 # Generate figure 7
 # Sarah Brands & Amber Brands
-# Created November 2022; Last edited May 2023
+# Created November 2022; Last edited October 2026
 
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
-import read_data
+import data_store
+import decimate
+import time_index
 
 global plotdir
 plotdir = '../plots/'
@@ -17,7 +19,7 @@ color_RH = '#ffb300'
 def main():
 
     # import data
-    df = read_data.data2df(do_correct=True, be_verbose=False)
+    df = data_store.load_data(do_correct=True, be_verbose=False)
 
     df['ver_perc'] = df['ver_rel']/3000*100
     df['hor_perc'] = df['hor_rel']/2400*100
@@ -29,7 +31,27 @@ def main():
     horizontal/vertical expansion"""
     overplot_temp_hum_stretch(df, savefig=True)
 
-def overplot_temp_hum_stretch(df, savefig, figname=''):
+def overplot_temp_hum_stretch(df, savefig, figname='', do_decimate=False,
+        show=True, zoom=('2021-05-31 10:00', '2021-06-04 04:00'),
+        detail=('2021-05-31 09:36', '2021-06-01 04:48')):
+    """
+    Plot relative humidity and displacement over the whole period (panel a)
+    and zoomed in (panels b and c).
+
+    Input:
+    - df [pandas dataframe]: dataframe with leather displacement data
+    - savefig [bool]: save the figure in plotdir
+    - figname [str]: file name of the figure (default = 'fig7_mm.png')
+    - do_decimate [bool]: if True, reduce the series in panel a) to the
+      minimum and maximum per pixel before plotting (see decimate.py). This
+      is much faster for long series and looks the same (default = False)
+    - show [bool]: show the figure (default = True)
+    - zoom [tuple of str]: start and end time of the data in panels b) and
+      c), with daily ticks in panel b)
+    - detail [tuple of str]: start and end time shown in panel c), with
+      ticks every 4 hours
+
+    """
 
     # Initiate figure
     fig = plt.figure(figsize=(8, 6))
@@ -41,16 +63,22 @@ def overplot_temp_hum_stretch(df, savefig, figname=''):
     axs22 = fig.add_subplot(gs[6:10, 0:4])
     axs21 = fig.add_subplot(gs[6:10, 6:10])
 
-    ax = plt.gca()
     ms = 0.5
     alpha = 0.1
+    dpi = 300
+
+    if do_decimate:
+        plot = lambda ax, x, y, **kwargs: decimate.plot_decimated(ax, x, y,
+            dpi=dpi, **kwargs)
+    else:
+        plot = lambda ax, x, y, **kwargs: ax.plot(x, y, **kwargs)
 
     ax12 =  axs1.twinx()
-    axs1.plot(df['days_diff'], df['RV_avg'], marker='o', ms=ms, lw=0,
+    plot(axs1, df['days_diff'], df['RV_avg'], marker='o', ms=ms, lw=0,
         color=color_RH, label='Relative Humidity')
-    ax12.plot(df['days_diff'], df['ver_rel'], marker='o', ms=ms, lw=0,
+    plot(ax12, df['days_diff'], df['ver_rel'], marker='o', ms=ms, lw=0,
         color=color_ver, label='Vertical replacement')
-    ax12.plot(df['days_diff'], df['hor_rel'], marker='o', ms=ms, lw=0,
+    plot(ax12, df['days_diff'], df['hor_rel'], marker='o', ms=ms, lw=0,
         color=color_hor, label='Horizontal replacement')
     ax12.set_ylabel('Displacement (mm)')
     axs1.set_ylabel('Relative Humidity (%)')
@@ -61,87 +89,65 @@ def overplot_temp_hum_stretch(df, savefig, figname=''):
 
     df['only_dates'] = pd.to_datetime(df['datetime']).dt.date
 
-    df_datetime = df.datetime
-    month_start = pd.DatetimeIndex(df_datetime).is_month_start
-
-    date_labels = []
-    date_labels_str = []
-    for rowi in range(len(month_start)):
-        if month_start[rowi]:
-            date_labels.append(df['days_diff'].iloc[rowi])
-            date_labels_str.append(df['datetime'].iloc[rowi].strftime('%-d %b %Y'))
-    date_labels_str, unique_args = np.unique(date_labels_str, return_index=True)
-    date_labels_unique = []
-    for iarg in unique_args:
-        date_labels_unique.append(date_labels[iarg])
-
-    index = np.where(month_start)
-    start_indices = [0, index[0][0]]
-    for i in range(1, len(index[0])):
-        if int(index[0][i] - 1) != int(index[0][i-1]):
-            start_indices.append(index[0][i])
-    start_indices.append(len(df)-1)
-
-    axs1.set_xticks(date_labels_unique)
-    axs1.set_xticklabels(date_labels_str, rotation=45, ha='right')
+    # Ticks at the first sample of every month, and shade alternate months
+    days = df['days_diff'].values
+    month_rows = time_index.month_starts(df['datetime'])
+    axs1.set_xticks(days[month_rows])
+    axs1.set_xticklabels(df['datetime'].iloc[month_rows].dt.strftime(
+        '%-d %b %Y'), rotation=45, ha='right')
 
+    start_indices = np.concatenate(([0], month_rows, [len(df) - 1]))
     colors = ['grey', 'lightgrey']
     for i in range(len(start_indices)-1):
-        if i % 2 == 0:
-            axs1.axvspan(df.loc[start_indices[i], 'days_diff'],
-                df.loc[start_indices[i+1], 'days_diff'],
-                color=colors[0], alpha=alpha)
-        else:
-            axs1.axvspan(df.loc[start_indices[i], 'days_diff'],
-                df.loc[start_indices[i+1], 'days_diff'],
-                color=colors[1], alpha=alpha)
+        axs1.axvspan(days[start_indices[i]], days[start_indices[i+1]],
+            color=colors[i % 2], alpha=alpha)
 
     axs1.set_xlim(np.min(df['days_diff']), np.max(df['days_diff']))
 
     # Change the marker size manually for both lines
-    for i in range(len(lgnd1.legendHandles)):
-        lgnd1.legendHandles[i]._legmarker.set_markersize(3)
+    # (older versions of matplotlib keep the marker in a separate line)
+    for handle in lgnd1.legendHandles:
+        getattr(handle, '_legmarker', handle).set_markersize(3)
 
-    start = 4020
-    end = 4200
+    # Zoomed panels: select the samples by time
+    df_zoom = time_index.select_range(df, *zoom)
     ms = 2.5
 
     ax212 = axs21.twinx()
-    axs21.plot(df['days_diff'][start:end], df['RV_avg'][start:end],
+    axs21.plot(df_zoom['days_diff'], df_zoom['RV_avg'],
         marker='o', ms=ms, lw=0, color=color_RH, label='Relative Humidity')
-    ax212.plot(df['days_diff'][start:end], df['ver_rel'][start:end],
+    ax212.plot(df_zoom['days_diff'], df_zoom['ver_rel'],
         marker='o', ms=ms, lw=0, color=color_ver, label='Vertical replacement')
-    ax212.plot(df['days_diff'][start:end], df['hor_rel'][start:end],
+    ax212.plot(df_zoom['days_diff'], df_zoom['hor_rel'],
         marker='o', ms=ms, lw=0, color=color_hor, label='Horizontal replacement')
     ax212.set_ylabel('Displacement (mm)')
     axs21.set_ylabel('Relative Humidity (%)')
 
-    ax.set_xlim(83.4, 84.2)
-    df_ticks_ax21 = df.copy().iloc[[4024, 4032, 4040, 4048, 4056]]
-
-
-    axs21.set_xticks(df_ticks_ax21['days_diff'])
-    axs21.set_xticklabels(df_ticks_ax21['datetime'].dt.strftime('%-d %b %H:%M'),
-        rotation=45, ha='right')
+    df_detail = time_index.select_range(df, *detail)
+    if len(df_detail) > 0:
+        axs21.set_xlim(time_index.value_at(df['datetime'], days, detail))
+        ticks = time_index.period_starts(df_detail['datetime'], '4h')
+        axs21.set_xticks(time_index.value_at(df['datetime'], days, ticks))
+        axs21.set_xticklabels(ticks.strftime('%-d %b %H:%M'),
+            rotation=45, ha='right')
 
-    start = 4020
-    end = 4200
     ms = 1.5
 
     ax222 = axs22.twinx()
-    axs22.plot(df['days_diff'][start:end], df['RV_avg'][start:end],
+    axs22.plot(df_zoom['days_diff'], df_zoom['RV_avg'],
         marker='o', ms=ms, lw=0, color=color_RH, label='Relative Humidity')
-    ax222.plot(df['days_diff'][start:end], df['ver_rel'][start:end],
+    ax222.plot(df_zoom['days_diff'], df_zoom['ver_rel'],
         marker='o', ms=ms, lw=0, color=color_ver, label='Vertical replacement')
-    ax222.plot(df['days_diff'][start:end], df['hor_rel'][start:end],
+    ax222.plot(df_zoom['days_diff'], df_zoom['hor_rel'],
         marker='o', ms=ms, lw=0, color=color_hor, label='Horizontal replacement')
     ax222.set_ylabel('Displacement (mm)')#, fontsize=8)
     axs22.set_ylabel('Relative Humidity (%)')#, fontsize=8)
 
-    df_ticks_ax22 = df.copy().iloc[[4048, 4096,4144, 4192]]
-    axs22.set_xticks(df_ticks_ax22['days_diff'])
-    axs22.set_xticklabels(df_ticks_ax22['datetime'].dt.strftime('%-d %b'),
-        rotation=45, ha='right')
+    if len(df_zoom) > 0:
+        ticks = time_index.period_starts(df_zoom['datetime'], '1D')
+        axs22.set_xticks(time_index.value_at(df['datetime'], days, ticks))
+        axs22.set_xticklabels(ticks.strftime('%-d %b'), rotation=45,
+            ha='right')
 
     ylimdiff_hum_main = axs1.get_ylim()[1] - axs1.get_ylim()[0]
     ylimdiff_dis_main = ax12.get_ylim()[1] - ax12.get_ylim()[0]
@@ -160,9 +166,10 @@ def overplot_temp_hum_stretch(df, savefig, figname=''):
     if savefig:
         if figname == '':
             figname = 'fig7_mm.png'
-        plt.savefig(plotdir + figname, dpi=300)
+        plt.savefig(plotdir + figname, dpi=dpi)
 
-    plt.show()
+    if show:
+        plt.show()
 
 if __name__ == '__main__':
     main()
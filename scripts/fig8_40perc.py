@@ -1,31 +1,39 @@
 # Generate figure 8
 # Sarah Brands & Amber Brands
-# Created November 2022; Last edited May 2023
+# Created November 2022; Last edited October 2026
 
 import numpy as np
 import pandas as pd
-import read_data
+import data_store
+import bootstrap
+import rolling
 from matplotlib import pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 
+global plotdir
+plotdir = '../plots/'
+
+# Horizontal size of leather: 2400 mm
+# Vertical size of leather: 3000 mm
+HOR_TOTSIZE = 2400
+VER_TOTSIZE = 3000
+
 def main():
     # import data
-    df = read_data.data2df(do_correct=True, be_verbose=False)
+    df = data_store.load_data(do_correct=True, be_verbose=False)
 
-    # Convert to percentages
-    # Horizontal size of leather: 2400 mm
-    # Vertical size of leather: 3000 mm
+    plot_displacement_rh(df, savefig=True)
 
-    hor_totsize = 2400
-    ver_totsize = 3000
-    df['ver_perc'] = df['ver_rel']/ver_totsize*100
-    df['hor_perc'] = df['hor_rel']/hor_totsize*100
+def rh_bin_edges():
+    """
+    Edges of the bins of relative humidity in which the displacement is
+    averaged, 1% wide from 40% to 80%. The displacement at a difference of
+    40% relative humidity is the difference between the outer bins.
 
-    df['ver_perc'] = df['ver_perc'] - np.min(df['ver_perc'])
-    df['hor_perc'] = df['hor_perc'] - np.min(df['hor_perc'])
+    Output:
+    - edges [numpy array]: bin edges (%), the bins exclude their edges
 
-
-    # Compute the percentual change at a difference of 40% Relative Humidity
+    """
 
     minRV = 39
     maxRV = 80
@@ -34,18 +42,53 @@ def main():
     deltaRV = 1.0
     nsteps = int(diffRV/deltaRV)
     linRV = np.linspace(minRV, maxRV-deltaRV, nsteps) + deltaRV
+
+    return np.append(linRV - 0.5*deltaRV, linRV[-1] + 0.5*deltaRV)
+
+def plot_displacement_rh(df, savefig, figname='', show=True, nboot=2000,
+        block='7D', nprocs=1):
+    """
+    Plot the displacement as a function of relative humidity, coloured by
+    the change in displacement over 30 days and over 6 hours, and print the
+    displacement at a difference of 40% relative humidity. Its uncertainty
+    is estimated with a block bootstrap, which accounts for the
+    autocorrelation of the time series (see bootstrap.bootstrap_means).
+
+    Input:
+    - df [pandas dataframe]: dataframe with leather displacement data
+    - savefig [bool]: save the figure in plotdir
+    - figname [str]: file name of the figure (default = 'fig8_perc_mm.png')
+    - show [bool]: show the figure (default = True)
+    - nboot [int]: number of bootstrap replicates (default = 2000)
+    - block [str]: duration of the bootstrap blocks (default = '7D')
+    - nprocs [int]: number of processes for the bootstrap (default = 1)
+
+    """
+
+    # Convert to percentages
+
+    hor_totsize = HOR_TOTSIZE
+    ver_totsize = VER_TOTSIZE
+    df['ver_perc'] = df['ver_rel']/ver_totsize*100
+    df['hor_perc'] = df['hor_rel']/hor_totsize*100
+
+    df['ver_perc'] = df['ver_perc'] - np.min(df['ver_perc'])
+    df['hor_perc'] = df['hor_perc'] - np.min(df['hor_perc'])
+
+
+    # Compute the percentual change at a difference of 40% Relative Humidity
+
     nsig = 2
 
-    hor_avg = []
-    hor_std = []
-    ver_avg = []
-    ver_std = []
-    for the_min in linRV:
-        df_tmp = df.copy()[(df['RV_avg'] > the_min - 0.5*deltaRV) & (df['RV_avg'] < the_min + 0.5*deltaRV)]
-        hor_avg.append(np.mean(df_tmp['hor_perc']))
-        hor_std.append(np.std(df_tmp['hor_perc'])*nsig)
-        ver_avg.append(np.mean(df_tmp['ver_perc']))
-        ver_std.append(np.std(df_tmp['ver_perc'])*nsig)
+    # Statistics per RV bin; the bins exclude their edges
+    edges = rh_bin_edges()
+    stats, means = bootstrap.binned_uncertainty(df['RV_avg'],
+        df[['hor_perc', 'ver_perc']], edges, df['datetime'], closed='neither',
+        nboot=nboot, block=block, nprocs=nprocs)
+    hor_avg = stats['hor_perc_mean'].values
+    hor_std = stats['hor_perc_std'].values*nsig
+    ver_avg = stats['ver_perc_mean'].values
+    ver_std = stats['ver_perc_std'].values*nsig
     mean_std_hor = np.mean(hor_std)
     mean_std_ver = np.mean(ver_std)
 
@@ -60,13 +103,49 @@ def main():
     disp_hor = hor_avg_80 - hor_avg_40
     disp_ver = ver_avg_80 - ver_avg_40
 
-    print('Horizontal displacement at 40% difference', round(disp_hor,2), '+/-', round(np.sqrt(mean_std_hor**2+ mean_std_hor**2),2))
-    print('Vertical   displacement at 40% difference', round(disp_ver,2), '+/-', round(np.sqrt(mean_std_ver**2+ mean_std_ver**2),2))
-
-    df['hor_perc_roll_month'] = df['hor_perc'].rolling(48*30).mean()
-    df['hor_perc_roll_6h'] = df['hor_perc'].rolling(12).mean()
-    df['ver_perc_roll_month'] = df['ver_perc'].rolling(48*30).mean()
-    df['ver_perc_roll_6h'] = df['ver_perc'].rolling(12).mean()
+    # Uncertainty (nsig standard errors) of the difference between the
+    # highest and lowest bin, from the bootstrap replicates of both means.
+    # The outer bins can hold a few samples of a single episode, which the
+    # bootstrap cannot vary (see bootstrap.bootstrap_means). Then the
+    # uncertainty is given for the outermost bins that are resolved.
+    disp_se = bootstrap.summarize(means[:, -1, :] - means[:, 0, :])[0]
+    rh = stats.index.values
+    counts = stats['hor_perc_count'].values
+    resolved = np.flatnonzero(~np.isnan(stats['hor_perc_mean_se'].values) &
+        ~np.isnan(stats['ver_perc_mean_se'].values))
+    if np.isnan(disp_se).any():
+        outer = [i for i in (0, len(rh) - 1) if i not in resolved]
+        print('Not resolved by the bootstrap (samples within less than two '
+            '%s blocks, or too few valid replicates):' % block, ', '.join(
+            '%g%% RH (%d samples)' % (rh[i], counts[i]) for i in outer))
+    if np.isnan(disp_se).any() and len(resolved) > 1:
+        i0, i1 = resolved[0], resolved[-1]
+        inner = bootstrap.summarize(means[:, i1, :] - means[:, i0, :])[0]
+        inner_disp = (hor_avg[i1] - hor_avg[i0], ver_avg[i1] - ver_avg[i0])
+    for j, (name, disp) in enumerate((('Horizontal', disp_hor),
+            ('Vertical  ', disp_ver))):
+        if np.isnan(disp_se[j]):
+            print(name, 'displacement at 40% difference', round(disp,2),
+                '(no bootstrap uncertainty)')
+            if len(resolved) > 1:
+                print(name, 'displacement at %g%% difference' % (rh[i1] -
+                    rh[i0]), round(inner_disp[j],2), '+/- %.2g' %
+                    (nsig*inner[j]), '(%g%% to %g%% RH, %d and %d samples)'
+                    % (rh[i0], rh[i1], counts[i0], counts[i1]))
+        else:
+            print(name, 'displacement at 40% difference', round(disp,2),
+                '+/- %.2g' % (nsig*disp_se[j]), '(%d and %d samples)' % (
+                counts[0], counts[-1]))
+
+    # Rolling means over time windows, which are also correct where the
+    # sampling interval is irregular
+    df_roll = rolling.rolling_stats(df['datetime'],
+        df[['hor_perc', 'ver_perc']], {'month': '30D', '6h': '6h'},
+        stats=('mean',), full_window=True)
+    df['hor_perc_roll_month'] = df_roll['hor_perc_roll_month_mean']
+    df['hor_perc_roll_6h'] = df_roll['hor_perc_roll_6h_mean']
+    df['ver_perc_roll_month'] = df_roll['ver_perc_roll_month_mean']
+    df['ver_perc_roll_6h'] = df_roll['ver_perc_roll_6h_mean']
 
     df['delta_roll_hor_month'] = df['hor_perc'] - df['hor_perc_roll_month']
     df['delta_roll_ver_month'] = df['ver_perc'] - df['ver_perc_roll_month']
@@ -182,9 +261,13 @@ def main():
     ax[1,1].text(66.3, 0.27, '  ' + str(mm_ind_len_ver) + ' mm',
         ha='left', va='center', color=the_mm_color)
 
-    plt.savefig('../plots/fig8_perc_mm.png', dpi=300)
+    if savefig:
+        if figname == '':
+            figname = 'fig8_perc_mm.png'
+        plt.savefig(plotdir + figname, dpi=300)
 
-    plt.show()
+    if show:
+        plt.show()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,345 @@
+# Lag and cross-correlation between relative humidity and displacement
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import read_data
+import data_store
+
+def resample_regular(df, columns=('RV_avg', 'T_avg', 'ver_rel', 'hor_rel'),
+        interval='30min', max_gap='3h'):
+    """
+    Resample columns of the cleaned data to a regular time grid, by linear
+    interpolation between the samples. Grid points in gaps in the data
+    longer than max_gap are NaN.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+    - columns [list of str]: columns to resample
+    - interval [str]: grid interval, understood by pandas.Timedelta
+    - max_gap [str]: longest gap that is interpolated
+
+    Output:
+    - df_grid [pandas dataframe]: the columns on the regular grid, indexed
+      by datetime
+
+    """
+
+    t = df['datetime'].values.astype('datetime64[ns]').view(np.int64)
+    step = pd.Timedelta(interval).value
+    grid = np.arange(-(-t[0]//step)*step, t[-1] + 1, step)
+
+    # Grid points between two samples that are further apart than max_gap
+    after = np.searchsorted(t, grid, side='left')
+    before = np.maximum(after - 1, 0)
+    after = np.minimum(after, len(t) - 1)
+    in_gap = (t[after] - t[before] > pd.Timedelta(max_gap).value) & \
+        (t[after] != grid)
+
+    df_grid = pd.DataFrame(index=pd.DatetimeIndex(grid, name='datetime'))
+    for col in columns:
+        v = np.asarray(df[col], dtype=float)
+        valid = ~np.isnan(v)
+        resampled = np.interp(grid, t[valid], v[valid])
+        resampled[in_gap] = np.nan
+        df_grid[col] = resampled
+
+    return df_grid
+
+def highpass(x, length):
+    """
+    Remove variations slower than a given number of samples, by subtracting
+    a centred moving average (computed from cumulative sums). NaN values
+    are ignored in the average.
+
+    Input:
+    - x [numpy array]: regularly sampled series
+    - length [int]: length of the moving average (samples)
+
+    Output:
+    - x_high [numpy array]
+
+    """
+
+    valid = ~np.isnan(x)
+    cs_n = np.concatenate(([0], np.cumsum(valid)))
+    cs_x = np.concatenate(([0.0], np.cumsum(np.where(valid, x, 0.0))))
+    i = np.arange(len(x))
+    lo = np.maximum(i - length//2, 0)
+    hi = np.minimum(i + length - length//2, len(x))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return x - (cs_x[hi] - cs_x[lo])/(cs_n[hi] - cs_n[lo])
+
+def sliding_windows(x, window, step):
+    """
+    Sliding windows over the last axis of an array, as a view (no copy).
+
+    Input:
+    - x [numpy array]: regularly sampled series
+    - window [int]: length of the windows (samples)
+    - step [int]: distance between the starts of the windows (samples)
+
+    Output:
+    - windows [numpy array]: one row per window
+    - starts [numpy array]: index of the first sample of every window
+
+    """
+
+    windows = np.lib.stride_tricks.sliding_window_view(x, window,
+        axis=-1)[..., ::step, :]
+    starts = np.arange(0, len(x) - window + 1, step)
+
+    return windows, starts
+
+def detrend(x):
+    """
+    Subtract the mean or, for windows, the linear trend, per row, ignoring
+    NaN values.
+
+    Input:
+    - x [numpy array]: series, or one window per row
+
+    Output:
+    - x_detrended [numpy array]
+
+    """
+
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=-1, keepdims=True)
+    t = np.where(valid, np.arange(x.shape[-1], dtype=float), 0.0)
+    v = np.where(valid, x, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = t.sum(axis=-1, keepdims=True)/n
+        v_mean = v.sum(axis=-1, keepdims=True)/n
+        dt = np.where(valid, t - t_mean, 0.0)
+        slope = (dt*v).sum(axis=-1, keepdims=True) / \
+            (dt*dt).sum(axis=-1, keepdims=True)
+    slope = np.where(np.isfinite(slope), slope, 0.0)
+
+    return x - v_mean - slope*(np.arange(x.shape[-1]) - t_mean)
+
+def cross_correlation(x, y, max_lag, min_overlap=0.5):
+    """
+    Normalised cross-correlation of x and y for all lags up to max_lag,
+    computed with FFTs, for many series (windows) at once. The correlation
+    at lag k compares x at time t with y at time t + k, so a positive lag
+    means that y follows x. NaN values are left out: the sums at every lag
+    only include the samples where both series are valid (masked
+    normalised cross-correlation). x and y should have a mean of zero, see
+    detrend.
+
+    Input:
+    - x, y [numpy arrays]: series of equal length, or one per row
+    - max_lag [int]: largest lag (samples)
+    - min_overlap [float]: minimal fraction of the samples that must be
+      valid in both series at a lag, otherwise the correlation is NaN
+
+    Output:
+    - lags [numpy array]: lags from -max_lag to max_lag (samples)
+    - corr [numpy array]: correlation per lag (last axis)
+
+    """
+
+    n = x.shape[-1]
+    nfft = 1 << int(np.ceil(np.log2(n + max_lag)))
+    mx = ~np.isnan(x)
+    my = ~np.isnan(y)
+    x = np.where(mx, x, 0.0)
+    y = np.where(my, y, 0.0)
+
+    # All correlations share the FFTs of the series and their masks
+    X, Y, XX, YY, MX, MY = (np.fft.rfft(a, nfft) for a in
+        (x, y, x*x, y*y, mx.astype(float), my.astype(float)))
+
+    def correlate(A, B):
+        c = np.fft.irfft(np.conj(A)*B, nfft)
+        return np.concatenate((c[..., nfft - max_lag:], c[..., :max_lag + 1]),
+            axis=-1)
+
+    sxy = correlate(X, Y)
+    sxx = correlate(XX, MY)
+    syy = correlate(MX, YY)
+    count = correlate(MX, MY)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = sxy/np.sqrt(sxx*syy)
+    corr[(count < min_overlap*n - 0.5) | ~(sxx > 1e-12) | ~(syy > 1e-12)] = \
+        np.nan
+
+    return np.arange(-max_lag, max_lag + 1), corr
+
+def best_lag(lags, corr):
+    """
+    Lag at which the cross-correlation is highest, refined to a fraction of
+    a sample by fitting a parabola through the maximum and its neighbours.
+
+    Input:
+    - lags [numpy array]: lags (samples), see cross_correlation
+    - corr [numpy array]: correlation per lag (last axis)
+
+    Output:
+    - lag [numpy array]: lag of the maximum (samples), NaN if there is none
+    - corr_max [numpy array]: correlation at the maximum
+
+    """
+
+    corr = np.atleast_2d(corr)
+    found = ~np.all(np.isnan(corr), axis=-1)
+    i = np.argmax(np.where(np.isnan(corr), -np.inf, corr), axis=-1)
+    rows = np.arange(corr.shape[0])
+    peak = corr[rows, i]
+
+    left = corr[rows, np.maximum(i - 1, 0)]
+    right = corr[rows, np.minimum(i + 1, corr.shape[-1] - 1)]
+    curvature = left - 2*peak + right
+    inside = (i > 0) & (i < corr.shape[-1] - 1) & (curvature < 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(inside, 0.5*(left - right)/curvature, 0.0)
+    shift = np.where(np.isfinite(shift), shift, 0.0)
+
+    lag = np.where(found, lags[i] + shift, np.nan)
+    corr_max = np.where(found, peak - 0.25*(left - right)*shift, np.nan)
+
+    return lag, corr_max
+
+def lag_analysis(df, x='RV_avg', ys=('ver_rel', 'hor_rel'), interval='30min',
+        max_lag='3D', window=None, step='1D', highpass_length=None,
+        min_valid=0.5, batch_size=256):
+    """
+    Lag of the displacement (or another quantity) with respect to the
+    relative humidity, from the maximum of their cross-correlation. The
+    series are resampled to a regular grid. Over sliding windows, the
+    change of the response time with the season can be followed; all
+    windows are computed at once.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+    - x [str]: driving quantity (default = 'RV_avg')
+    - ys [list of str]: responding quantities
+    - interval [str]: interval of the regular grid (default = '30min')
+    - max_lag [str]: largest lag to consider (default = '3D')
+    - window [str]: length of the sliding windows, e.g. '30D'; None for a
+      single window over all data (default = None)
+    - step [str]: distance between the sliding windows (default = '1D')
+    - highpass_length [str]: if given, variations slower than this (e.g.
+      '7D') are removed first, so that the seasonal cycle and drift do not
+      dominate the correlation (default = None)
+    - min_valid [float]: minimal fraction of valid samples in a window, and
+      of overlapping valid samples at a lag
+    - batch_size [int]: number of windows that are transformed at once,
+      which limits the memory use (default = 256)
+
+    Output:
+    - df_lag [pandas dataframe]: per window (indexed by the centre time)
+      and per quantity y the lag in hours ('<y>_lag_h', positive if y
+      follows x) and the correlation at that lag ('<y>_corr'), and the
+      fraction of valid samples ('valid')
+
+    """
+
+    grid = resample_regular(df, [x] + list(ys), interval)
+    dt = pd.Timedelta(interval)
+    nlag = int(pd.Timedelta(max_lag)/dt)
+    nwin = len(grid) if window is None else int(pd.Timedelta(window)/dt)
+    nstep = max(int(pd.Timedelta(step)/dt), 1)
+    if nwin > len(grid):
+        raise ValueError('The window is longer than the data')
+
+    # Windows are views on the series; they are copied (detrended) per batch
+    def prepare(col):
+        v = grid[col].values
+        if highpass_length is not None:
+            v = highpass(v, int(pd.Timedelta(highpass_length)/dt))
+        return sliding_windows(v, nwin, nstep)
+
+    xw, starts = prepare(x)
+    valid = np.empty(len(starts))
+    for i in range(0, len(starts), batch_size):
+        valid[i:i + batch_size] = np.mean(~np.isnan(xw[i:i + batch_size]),
+            axis=-1)
+    centres = grid.index[starts] + (nwin - 1)*dt/2
+    df_lag = pd.DataFrame({'valid': valid}, index=pd.DatetimeIndex(centres,
+        name='datetime'))
+
+    hours = dt/pd.Timedelta('1h')
+    for y in ys:
+        yw = prepare(y)[0]
+        lag = np.empty(len(starts))
+        corr_max = np.empty(len(starts))
+        for i in range(0, len(starts), batch_size):
+            batch = slice(i, i + batch_size)
+            lags, corr = cross_correlation(detrend(xw[batch]),
+                detrend(yw[batch]), nlag, min_overlap=min_valid)
+            lag[batch], corr_max[batch] = best_lag(lags, corr)
+        lag[valid < min_valid] = np.nan
+        corr_max[valid < min_valid] = np.nan
+        df_lag[y + '_lag_h'] = lag*hours
+        df_lag[y + '_corr'] = corr_max
+
+    return df_lag
+
+def lag_by_installation(df, **kwargs):
+    """
+    Run lag_analysis for every installation in combined data (see
+    batch.process_logs).
+
+    Input:
+    - df [pandas dataframe]: data with an 'installation' column
+    - kwargs: passed to lag_analysis
+
+    Output:
+    - df_lag [pandas dataframe]: results with an 'installation' column
+
+    """
+
+    results = []
+    for installation, group in df.groupby('installation', sort=False):
+        result = lag_analysis(group, **kwargs)
+        result.insert(0, 'installation', installation)
+        results.append(result)
+
+    return pd.concat(results)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Lag of the displacement '
+        'with respect to the relative humidity, from FFT cross-correlation.')
+    parser.add_argument('logfile', nargs='?', default=read_data.LOGFILE,
+        help='log file (default: %(default)s)')
+    parser.add_argument('--interval', default='30min',
+        help='interval of the regular grid (default: %(default)s)')
+    parser.add_argument('--max-lag', default='3D',
+        help='largest lag (default: %(default)s)')
+    parser.add_argument('--window', default='30D',
+        help='length of the sliding windows (default: %(default)s)')
+    parser.add_argument('--step', default='7D',
+        help='distance between the windows (default: %(default)s)')
+    parser.add_argument('--highpass', default='7D',
+        help='remove variations slower than this, or "none" '
+        '(default: %(default)s)')
+    parser.add_argument('--output', default=None,
+        help='write the results per window to this .csv file')
+    args = parser.parse_args(argv)
+
+    df = data_store.load_data(args.logfile, do_correct=True, compact=True)
+    hp = None if args.highpass.lower() == 'none' else args.highpass
+
+    overall = lag_analysis(df, interval=args.interval, max_lag=args.max_lag,
+        highpass_length=hp)
+    print('Whole record:')
+    print(overall.round(3).to_string())
+
+    windows = lag_analysis(df, interval=args.interval, max_lag=args.max_lag,
+        window=args.window, step=args.step, highpass_length=hp)
+    print('\nPer window of', args.window + ':')
+    print(windows.round(3).to_string())
+    if args.output is not None:
+        windows.to_csv(args.output)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# Render all figures without a display, in parallel, from a single load
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import os
+import sys
+import argparse
+import traceback
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+import read_data
+import data_store
+import batch
+import fig7_mm
+import fig8_40perc
+
+FIGURES = {
+    'fig7': (fig7_mm, fig7_mm.overplot_temp_hum_stretch, 'fig7_mm'),
+    'fig8': (fig8_40perc, fig8_40perc.plot_displacement_rh, 'fig8_perc_mm'),
+}
+
+def make_jobs(df, figures, outdir, by_installation=False, period=None):
+    """
+    List the figures to render: every figure for the full dataset and,
+    optionally, for every installation and/or every period.
+
+    The figures need the samples on a single timeline, sorted by time, so
+    the data of several installations is only rendered per installation.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, with an 'installation' column if
+      by_installation is True or if it holds several installations
+    - figures [list of str]: names of the figures, keys of FIGURES
+    - outdir [str]: directory to write the figures to
+    - by_installation [bool]: render the figures per installation
+    - period [str]: pandas period frequency, e.g. 'M' or 'Q', to render the
+      figures per period (default = None: the whole dataset)
+
+    Output:
+    - jobs [list of tuples]: (figure name, output file, dataframe)
+
+    """
+
+    if not by_installation and 'installation' in df and \
+            df['installation'].nunique() > 1:
+        raise ValueError('Data of several installations can only be '
+            'rendered per installation')
+
+    groups = [('', df)]
+    if by_installation:
+        groups = [('_' + str(name).replace('/', '-'), group) for name, group
+            in df.groupby('installation', sort=False)]
+
+    if period is not None:
+        groups = [(label + '_' + str(p).replace('/', '-'), subset)
+            for label, group in groups
+            for p, subset in group.groupby(group['datetime'].dt.to_period(
+                period), sort=True)]
+
+    jobs = []
+    for label, subset in groups:
+        for fig in figures:
+            figname = FIGURES[fig][2] + label + '.png'
+            jobs.append((fig, os.path.join(outdir, figname),
+                subset.reset_index(drop=True)))
+
+    return jobs
+
+def render(fig, filename, df):
+    """
+    Render a single figure to a file, without showing it. Errors are
+    returned instead of raised, so that one figure does not stop the rest.
+
+    Input:
+    - fig [str]: name of the figure, key of FIGURES
+    - filename [str]: output file
+    - df [pandas dataframe]: data to plot
+
+    Output:
+    - error [str]: traceback of the error, or None
+
+    """
+
+    module, plot, default_name = FIGURES[fig]
+    module.plotdir = os.path.dirname(filename) + os.sep
+    try:
+        plot(df.copy(), savefig=True, figname=os.path.basename(filename),
+            show=False)
+    except Exception:
+        return traceback.format_exc()
+    finally:
+        plt.close('all')
+
+    return None
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Render the figures without '
+        'a display, in parallel.')
+    parser.add_argument('paths', nargs='*', default=[read_data.LOGFILE],
+        help='log files and/or directories with log files (default: %s)'
+        % read_data.LOGFILE)
+    parser.add_argument('--outdir', default=fig7_mm.plotdir,
+        help='directory to write the figures to (default: %(default)s)')
+    parser.add_argument('--figures', nargs='+', default=list(FIGURES),
+        choices=list(FIGURES), help='figures to render (default: all)')
+    parser.add_argument('--period', default=None,
+        help='also render the figures per period, given as a pandas period '
+        'frequency, e.g. M (month) or Q (quarter)')
+    parser.add_argument('--nprocs', type=int, default=None,
+        help='number of worker processes (default: number of cores)')
+    args = parser.parse_args(argv)
+
+    # Load the data once, for all figures. The figures do not use the
+    # derived columns, so the compact form of the data suffices.
+    logs = batch.find_logs(args.paths)
+    if len(logs) == 1:
+        df = data_store.load_data(logs[0][1], do_correct=True, compact=True)
+        df['installation'] = logs[0][0]
+        errors = {}
+    else:
+        df, errors = batch.process_logs(logs, nprocs=args.nprocs,
+            compact=True)
+    for logfile, error in errors.items():
+        print('=== Failed to read:', logfile, '===', file=sys.stderr)
+        print(error, file=sys.stderr)
+    if df is None:
+        return 1
+
+    # The times of different installations are not on one sorted timeline,
+    # so with several installations the figures are rendered per
+    # installation only
+    os.makedirs(args.outdir, exist_ok=True)
+    several = df['installation'].nunique() > 1
+    jobs = make_jobs(df, args.figures, args.outdir, by_installation=several)
+    if args.period is not None:
+        jobs += make_jobs(df, args.figures, args.outdir,
+            by_installation=several, period=args.period)
+
+    nfailed = 0
+    with ProcessPoolExecutor(max_workers=args.nprocs) as pool:
+        futures = [pool.submit(render, *job) for job in jobs]
+        for (fig, filename, subset), future in zip(jobs, futures):
+            try:
+                error = future.result()
+            except Exception:
+                error = traceback.format_exc()
+            if error is None:
+                print('Saved', filename)
+            else:
+                nfailed += 1
+                print('=== Failed:', filename, '===', file=sys.stderr)
+                print(error, file=sys.stderr)
+
+    print('Rendered', len(jobs) - nfailed, 'of', len(jobs), 'figures')
+
+    return 1 if nfailed or errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
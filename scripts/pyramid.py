@@ -0,0 +1,352 @@
+# Multi-resolution store of the cleaned data, and a local query service
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import read_data
+import data_store
+import time_index
+
+PYRAMIDDIR = '../data/pyramid/'
+
+def default_columns(df):
+    """
+    Columns that are aggregated by default: all numeric columns except the
+    time since the start ('days_diff', 'minutes_diff').
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+
+    Output:
+    - columns [list of str]
+
+    """
+
+    return [col for col in df.columns if df[col].dtype.kind in 'fiu'
+        and col not in ('days_diff', 'minutes_diff')]
+
+def aggregate(bins, values, counts=None, sums=None, mins=None, maxs=None):
+    """
+    Minimum, maximum, mean and number of valid (not NaN) values per time
+    bin, in one pass with numpy reduceat. Either the values themselves are
+    aggregated, or the aggregates of a finer level (counts, sums, mins and
+    maxs per fine bin).
+
+    Input:
+    - bins [numpy array]: sorted bin number of every value (or fine bin)
+    - values [numpy array]: values, or None if aggregates are given
+    - counts, sums, mins, maxs [numpy array]: aggregates of a finer level
+
+    Output:
+    - starts [numpy array]: bin numbers of the (non-empty) bins
+    - counts, sums, mins, maxs [numpy array]: aggregates per bin
+
+    """
+
+    first = np.flatnonzero(np.diff(bins, prepend=bins[:1] - 1))
+    if values is not None:
+        valid = ~np.isnan(values)
+        counts = valid.astype(np.int64)
+        sums = np.where(valid, values, 0.0)
+        mins = maxs = values
+
+    return (bins[first], np.add.reduceat(counts, first),
+        np.add.reduceat(sums, first), np.fmin.reduceat(mins, first),
+        np.fmax.reduceat(maxs, first))
+
+def build_pyramid(df, dirname, columns=None, base='15min', factor=4):
+    """
+    Build a pyramid of aggregates of the cleaned data: per time bin the
+    minimum, maximum and mean of every column, at resolutions base,
+    base*factor, base*factor**2, ... up to a single bin. Every level is
+    computed from the one below it, so the cost is linear in the number of
+    samples. The levels and the data itself are written to a directory,
+    one subdirectory per level (see data_store.write_columns), and can be
+    queried with query_pyramid.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+    - dirname [str]: directory to write to (overwritten)
+    - columns [list of str]: columns to aggregate (default = None: see
+      default_columns)
+    - base [str]: width of the bins of the finest level, understood by
+      pandas.Timedelta (default = '15min'); levels with less than half
+      the bins of the previous level (or samples of the data) are skipped
+    - factor [int]: number of bins of a level that form a bin of the next
+      level (default = 4)
+
+    Output:
+    - info [dict]: description of the pyramid, also written to
+      'pyramid.json': the columns, the bin widths (in ns) and the number
+      of bins of every level
+
+    """
+
+    if columns is None:
+        columns = default_columns(df)
+    t = time_index.time_values(df['datetime'])
+    width = pd.Timedelta(base).value
+    origin = t[0] - t[0] % width
+
+    tmpdir = dirname.rstrip('/') + '.tmp'
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    os.makedirs(tmpdir)
+    data_store.write_columns(df[['datetime'] + list(columns)].reset_index(
+        drop=True), os.path.join(tmpdir, 'raw'))
+
+    info = {'columns': list(columns), 'nrows': len(df), 'levels': []}
+    bins = (t - origin)//width
+    aggregates = {col: (None, None, None, None) for col in columns}
+    values = {col: df[col].values.astype(float) for col in columns}
+    while True:
+        level = {}
+        for col in columns:
+            starts, counts, sums, mins, maxs = aggregate(bins, values[col],
+                *aggregates[col])
+            aggregates[col] = (counts, sums, mins, maxs)
+            with np.errstate(invalid='ignore'):
+                level[col + '_mean'] = sums/counts
+            level[col + '_min'] = mins
+            level[col + '_max'] = maxs
+            level[col + '_n'] = counts
+            values[col] = None
+        # Levels that are not at least twice as small as the previous one
+        # (or as the data) are not worth storing
+        nprev = info['levels'][-1]['nbins'] if info['levels'] else len(df)
+        if len(starts) <= nprev/2 or len(starts) == 1:
+            frame = pd.DataFrame(level)
+            frame.insert(0, 'datetime', pd.to_datetime(origin + starts*width))
+            data_store.write_columns(frame, os.path.join(tmpdir,
+                'level%02d' % len(info['levels'])))
+            info['levels'].append({'width_ns': int(width),
+                'nbins': len(frame)})
+
+        if len(starts) == 1:
+            break
+        bins = starts//factor
+        width *= factor
+
+    with open(os.path.join(tmpdir, 'pyramid.json'), 'w') as f:
+        json.dump(info, f, indent=1)
+
+    shutil.rmtree(dirname, ignore_errors=True)
+    os.replace(tmpdir, dirname)
+
+    return info
+
+def open_pyramid(dirname):
+    """
+    Open a pyramid written by build_pyramid. The data and the levels are
+    memory mapped (see data_store.read_columns), not read: opening takes
+    little time and memory, whatever the length of the data, and a query
+    only reads the rows that it searches and returns.
+
+    Input:
+    - dirname [str]: directory of the pyramid
+
+    Output:
+    - pyramid [dict]: the description (see build_pyramid) with the levels
+      ('raw' and 'level00', 'level01', ...) as dataframes
+
+    """
+
+    with open(os.path.join(dirname, 'pyramid.json')) as f:
+        pyramid = json.load(f)
+    pyramid['raw'] = data_store.read_columns(os.path.join(dirname, 'raw'))
+    for i, level in enumerate(pyramid['levels']):
+        level['data'] = data_store.read_columns(os.path.join(dirname,
+            'level%02d' % i))
+
+    return pyramid
+
+def query_pyramid(pyramid, start=None, end=None, columns=None,
+        max_points=2000):
+    """
+    Data in a time range at the finest resolution with at most max_points
+    samples or bins: the data itself if it has few enough samples in the
+    range, else the finest level of aggregates that does. The range is
+    found by binary search, so the time of a query depends on max_points,
+    not on the length of the data.
+
+    Input:
+    - pyramid [dict]: see open_pyramid
+    - start, end [str or datetime]: range [start, end) (None: no limit)
+    - columns [list of str]: columns to return (default = None: all)
+    - max_points [int]: largest number of samples or bins (default = 2000)
+
+    Output:
+    - level [str]: 'raw', or the width of the bins (e.g. '0 days 02:40:00')
+    - df [pandas dataframe]: the column 'datetime' (the start of the bin)
+      and per column the values, or its '_min', '_max' and '_mean' (and
+      '_n': the number of valid samples) per bin
+
+    """
+
+    if columns is None:
+        columns = pyramid['columns']
+    unknown = set(columns) - set(pyramid['columns'])
+    if unknown:
+        raise KeyError('Unknown columns: ' + ', '.join(sorted(unknown)))
+
+    raw = pyramid['raw']
+    rows = time_index.time_range(raw['datetime'], start, end)
+    if rows.stop - rows.start <= max_points:
+        return 'raw', raw.iloc[rows][['datetime'] + list(columns)]
+
+    # The coarsest level has a single bin, so the loop always ends with a
+    # level that fits. The bin that contains start is included.
+    for level in pyramid['levels']:
+        width = pd.Timedelta(level['width_ns'])
+        bin_start = None if start is None else \
+            pd.Timestamp(start) - width + pd.Timedelta(1)
+        data = level['data']
+        rows = time_index.time_range(data['datetime'], bin_start, end)
+        if rows.stop - rows.start <= max_points:
+            break
+    data = data.iloc[rows]
+
+    return str(width), data[['datetime'] + [col + suffix for col in columns
+        for suffix in ('_min', '_max', '_mean', '_n')]]
+
+def to_json(level, df):
+    """
+    Result of query_pyramid as a JSON-serialisable dictionary. Times are
+    ISO strings, NaN values are null.
+
+    Input:
+    - level [str], df [pandas dataframe]: output of query_pyramid
+
+    Output:
+    - result [dict]: {'level': ..., 'datetime': [...], 'columns':
+      {column: [...], ...}}
+
+    """
+
+    columns = {}
+    for col in df.columns[1:]:
+        values = df[col].values
+        if values.dtype.kind == 'f':
+            values = np.where(np.isnan(values), None, values.astype(object))
+        columns[col] = values.tolist()
+
+    return {'level': level, 'datetime': [t.isoformat() for t in
+        pd.DatetimeIndex(df['datetime'])], 'columns': columns}
+
+def make_handler(pyramid):
+    """
+    Request handler of the query service, for an opened pyramid.
+    GET /info returns the columns and levels; GET /query returns data, with
+    the parameters start, end, columns (comma-separated) and max_points,
+    e.g. /query?start=2021-06-01&end=2021-07-01&columns=RV_avg,ver_rel
+
+    Input:
+    - pyramid [dict]: see open_pyramid
+
+    Output:
+    - handler [class]: subclass of http.server.BaseHTTPRequestHandler
+
+    """
+
+    info = {'columns': pyramid['columns'], 'nrows': pyramid['nrows'],
+        'levels': [{'width': str(pd.Timedelta(level['width_ns'])),
+            'nbins': level['nbins']} for level in pyramid['levels']]}
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in
+                parse_qs(url.query).items()}
+            try:
+                if url.path == '/info':
+                    result = info
+                elif url.path == '/query':
+                    columns = query.get('columns')
+                    result = to_json(*query_pyramid(pyramid,
+                        query.get('start'), query.get('end'),
+                        None if columns is None else columns.split(','),
+                        int(query.get('max_points', 2000))))
+                else:
+                    self.send_error(404)
+                    return
+            except (KeyError, ValueError) as error:
+                self.send_error(400, str(error))
+                return
+
+            body = json.dumps(result).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(dirname, host='127.0.0.1', port=8000):
+    """
+    Serve a pyramid over HTTP (JSON) on the local machine, until
+    interrupted. See make_handler for the requests.
+
+    Input:
+    - dirname [str]: directory of the pyramid, see build_pyramid
+    - host [str]: address to listen on (default = '127.0.0.1')
+    - port [int]: port to listen on (default = 8000)
+
+    """
+
+    server = ThreadingHTTPServer((host, port),
+        make_handler(open_pyramid(dirname)))
+    print('Serving', dirname, 'on http://%s:%d/' % (host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Build a multi-resolution '
+        'store of the cleaned data, or serve it over HTTP.')
+    parser.add_argument('command', choices=('build', 'serve'))
+    parser.add_argument('logfile', nargs='?', default=read_data.LOGFILE,
+        help='log file (default: %(default)s)')
+    parser.add_argument('--dir', default=None,
+        help='directory of the pyramid (default: named after the log file '
+        'in ' + PYRAMIDDIR + ')')
+    parser.add_argument('--base', default='15min',
+        help='bin width of the finest level (default: %(default)s)')
+    parser.add_argument('--factor', type=int, default=4,
+        help='ratio of the bin widths of consecutive levels '
+        '(default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8000,
+        help='port of the query service (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    dirname = args.dir
+    if dirname is None:
+        dirname = os.path.join(PYRAMIDDIR, os.path.splitext(
+            os.path.basename(args.logfile))[0])
+
+    if args.command == 'build':
+        df = data_store.load_data(args.logfile, do_correct=True, compact=True)
+        info = build_pyramid(df, dirname, base=args.base, factor=args.factor)
+        for level in info['levels']:
+            print(pd.Timedelta(level['width_ns']), level['nbins'], 'bins')
+    else:
+        serve(dirname, port=args.port)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
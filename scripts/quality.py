@@ -0,0 +1,249 @@
+# Quality control of the cleaned data: flag spikes, stuck sensors and gaps
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import numpy as np
+import pandas as pd
+import read_data
+
+# Bits of the quality flags. A sample can have several flags, e.g.
+# SPIKE | GAP = 5.
+SPIKE = 1  # far from the rolling median, in units of the rolling MAD
+FLAT = 2   # part of a long run of identical values (stuck sensor)
+GAP = 4    # first sample after a gap in the data
+
+def rolling_median(x, window):
+    """
+    Centred rolling median over a number of samples, ignoring NaN values.
+    The running median of pandas takes O(log(window)) per sample.
+
+    Input:
+    - x [numpy array]: values
+    - window [int]: number of samples in the window
+
+    Output:
+    - median [numpy array]
+
+    """
+
+    return pd.Series(x).rolling(window, center=True,
+        min_periods=1).median().values
+
+def resolution(x):
+    """
+    Smallest non-zero difference between consecutive values: the resolution
+    of a sensor, as written in the log.
+
+    Input:
+    - x [numpy array]: values
+
+    Output:
+    - step [float]: resolution, or 0 if the values do not change
+
+    """
+
+    steps = np.abs(np.diff(x))
+    steps = steps[steps > 0]
+
+    return float(np.min(steps)) if len(steps) else 0.0
+
+def spike_flags(x, window=13, nsigma=10.0, min_scale=None):
+    """
+    Detect spikes: local extremes that differ from the rolling median by
+    more than nsigma times the robust standard deviation, estimated as
+    1.4826 times the rolling median absolute deviation (MAD) from the
+    rolling median. Where the values hardly change the rolling MAD is
+    (close to) zero, so the standard deviation is at least that of the
+    whole series (1.4826 times the mean absolute deviation). A level shift
+    (e.g. a reset) is not a spike if it lasts longer than half the window.
+
+    Input:
+    - x [numpy array]: values
+    - window [int]: number of samples in the window (default = 13)
+    - nsigma [float]: threshold (default = 10; the relative humidity
+      changes quickly when a door opens, lower values flag such changes)
+    - min_scale [float]: lower limit of the standard deviation (default =
+      None: the resolution of x, so that steps of one unit are not flagged)
+
+    Output:
+    - flags [numpy array]: True for spikes
+
+    """
+
+    x = np.asarray(x, dtype=float)
+    if min_scale is None:
+        min_scale = resolution(x)
+
+    deviation = np.abs(x - rolling_median(x, window))
+    if np.isnan(deviation).all():
+        return np.zeros(len(x), dtype=bool)
+    min_scale = max(min_scale, 1.4826*np.nanmean(deviation))
+    scale = np.maximum(1.4826*rolling_median(deviation, window), min_scale)
+
+    # Only the peak of an excursion, not the samples on its flanks
+    extreme = np.zeros(len(x), dtype=bool)
+    extreme[1:-1] = (x[1:-1] - x[:-2])*(x[1:-1] - x[2:]) > 0
+
+    return extreme & (deviation > nsigma*scale)
+
+def flat_flags(x, times, min_duration='24h'):
+    """
+    Detect stuck sensors: runs of identical consecutive values that last at
+    least min_duration.
+
+    Input:
+    - x [numpy array]: values
+    - times [pandas series or numpy array]: datetimes of the samples
+    - min_duration [str]: shortest run that is flagged, understood by
+      pandas.Timedelta (default = '24h')
+
+    Output:
+    - flags [numpy array]: True for samples in a long run
+
+    """
+
+    x = np.asarray(x)
+    t = np.asarray(times).astype('datetime64[ns]').view(np.int64)
+    if len(x) == 0:
+        return np.zeros(0, dtype=bool)
+
+    # NaN != NaN, so missing values never form a run
+    change = np.concatenate(([True], x[1:] != x[:-1]))
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:], len(x)) - 1
+    flat = t[ends] - t[starts] >= pd.Timedelta(min_duration).value
+
+    return flat[np.cumsum(change) - 1]
+
+def gap_flags(df, max_gap='2h'):
+    """
+    Detect gaps: samples that come more than max_gap after the previous
+    one. The interval is taken from the column 'interval_mins' if there is
+    one (see read_data.clean_data), else from the datetimes.
+
+    Input:
+    - df [pandas dataframe]: cleaned data
+    - max_gap [str]: longest regular interval, understood by
+      pandas.Timedelta (default = '2h')
+
+    Output:
+    - flags [numpy array]: True for the first sample after a gap
+
+    """
+
+    limit = pd.Timedelta(max_gap)
+    if 'interval_mins' in df:
+        return df['interval_mins'].values > limit.total_seconds()/60.0
+
+    t = df['datetime'].values.astype('datetime64[ns]').view(np.int64)
+
+    return np.diff(t, prepend=t[:1]) > limit.value
+
+def quality_flags(df, columns=None, flat_columns=None, schema=None,
+        spike_window=13, nsigma=10.0, flat_duration='24h', max_gap='2h'):
+    """
+    Quality flags of every sample, as bitmasks (SPIKE, FLAT, GAP). Every
+    check is a vectorised pass over a column: near-linear in the number of
+    samples.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+    - columns [list of str]: columns checked for spikes (default = None:
+      the displacements and the sensors of the schema)
+    - flat_columns [list of str]: columns checked for stuck values
+      (default = None: the sensors of the schema; the displacement can
+      legitimately stay the same for more than a day)
+    - schema [str or dict]: schema of the data, see read_data.load_schema
+      (default = None: read_data.SCHEMA)
+    - spike_window, nsigma: see spike_flags
+    - flat_duration: see flat_flags
+    - max_gap: see gap_flags
+
+    Output:
+    - flags [pandas dataframe]: per checked column the flags ('<col>_qc',
+      uint8), and the combination of all flags and the gaps ('qc'), with
+      the same index as df
+
+    """
+
+    schema = read_data.load_schema(schema)
+    if columns is None:
+        columns = [col for col in schema['columns'] if col in df]
+    if flat_columns is None:
+        flat_columns = [col for col in schema['columns'][2:] if col in df]
+
+    flags = pd.DataFrame(index=df.index)
+    combined = np.where(gap_flags(df, max_gap), GAP, 0).astype(np.uint8)
+    for col in list(dict.fromkeys(list(columns) + list(flat_columns))):
+        col_flags = np.zeros(len(df), dtype=np.uint8)
+        if col in columns:
+            col_flags[spike_flags(df[col].values, spike_window, nsigma)] |= \
+                SPIKE
+        if col in flat_columns:
+            col_flags[flat_flags(df[col].values, df['datetime'],
+                flat_duration)] |= FLAT
+        flags[col + '_qc'] = col_flags
+        combined |= col_flags
+    flags['qc'] = combined
+
+    return flags
+
+def apply_quality(df, action='mask', reject=SPIKE | FLAT, flags=None,
+        schema=None, **kwargs):
+    """
+    Run the quality control and mask or drop the flagged samples. The flags
+    are added to the data in the column 'qc'.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+    - action [str]: what to do with samples with one of the flags in
+      reject:
+      'flag': nothing, only add the column 'qc'
+      'mask': set the flagged values to NaN, per column, and recompute the
+              group averages of the schema (e.g. RV_avg) without them
+      'drop': remove the samples (rows)
+    - reject [int]: flags that are rejected (default = SPIKE | FLAT)
+    - flags [pandas dataframe]: output of quality_flags (default = None:
+      computed here)
+    - schema [str or dict]: schema of the data, see read_data.load_schema
+    - kwargs: passed to quality_flags
+
+    Output:
+    - df [pandas dataframe]: a new dataframe with the column 'qc'
+
+    """
+
+    if action not in ('flag', 'mask', 'drop'):
+        raise ValueError("action must be 'flag', 'mask' or 'drop'")
+
+    schema = read_data.load_schema(schema)
+    if flags is None:
+        flags = quality_flags(df, schema=schema, **kwargs)
+    df = df.copy()
+    df['qc'] = flags['qc'].values
+
+    if action == 'drop':
+        return df.take(np.flatnonzero((df['qc'].values & reject) == 0))
+
+    if action == 'mask':
+        sensors = schema['columns'][2:]
+        changed = np.zeros(len(df), dtype=bool)
+        for col in flags.columns[:-1]:
+            rejected = (flags[col].values & reject) != 0
+            col = col[:-len('_qc')]
+            df.iloc[np.flatnonzero(rejected), df.columns.get_loc(col)] = \
+                np.nan
+            if col in sensors:
+                changed |= rejected
+
+        # Recompute the group averages of the rows with masked sensors
+        groups = [name for name in schema['groups'] if name in df]
+        if changed.any() and groups and all(col in df for col in sensors):
+            rows = np.flatnonzero(changed)
+            means = read_data.group_means(df[sensors].values[rows].astype(
+                float), read_data.group_matrix(schema))
+            for name, mean in zip(schema['groups'], means.T):
+                if name in groups:
+                    df.iloc[rows, df.columns.get_loc(name)] = mean
+
+    return df
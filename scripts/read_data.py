@@ -1,11 +1,242 @@
 # Read data from .csv file into a pandas dataframe
 # Sarah Brands & Amber Brands
-# Created November 2022; Last edited May 2023
+# Created November 2022; Last edited October 2026
 
+import io
+import os
+import json
+import time
+import tracemalloc
 import numpy as np
 import pandas as pd
 import datetime as dt
 
+# Default log file and the constants used when cleaning the data. These are
+# part of the key of the data cache (see data_store.py), so changing any of
+# them automatically invalidates cached data.
+LOGFILE = '../data/log_20220315.csv'
+SCHEMA = '../data/schema.json'  # default columns and sensor groups
+TIMEZONE = 'Europe/Amsterdam'  # time zone of the logger clock
+VER_CUT = 0.25     # minimal vertical jump regarded as a reset (mm)
+HOR_CUT = 0.15     # minimal horizontal jump regarded as a reset (mm)
+NDROP = 14         # number of rows with irregular intervals at the start
+MIDNIGHT_ROW = 16  # first row at 00:00h after dropping the first NDROP rows
+MAX_RV = 100       # only rows with an average RV below this value are kept
+
+# Derived columns that are left out in compact mode, unless asked for
+OPTIONAL_COLUMNS = ('datetime_raw', 'minutes_diff', 'dver_raw', 'dhor_raw',
+    'interval_mins')
+
+def profile_start(profile):
+    """
+    Start measuring the first stage of the processing, see profile_stage.
+
+    Input:
+    - profile [dict]: report to add the stages to, or None to not measure
+
+    Output:
+    - start [tuple]: start of the stage, to pass to profile_stage (None if
+      profile is None)
+
+    """
+
+    if profile is None:
+        return None
+    profile.setdefault('stages', [])
+    if not tracemalloc.is_tracing():
+        return time.perf_counter(), None
+    tracemalloc.reset_peak()
+
+    return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+
+def profile_stage(profile, start, stage, nrows):
+    """
+    Record a stage of the processing in a profile report: its wall time,
+    the number of rows after the stage and, if tracemalloc is tracing, the
+    memory allocated during the stage and the peak on top of the memory in
+    use at its start. The next stage starts when this one is recorded.
+
+    Input:
+    - profile [dict]: report, or None to not measure
+    - start [tuple]: output of profile_start or of the previous stage
+    - stage [str]: name of the stage
+    - nrows [int]: number of rows after the stage
+
+    Output:
+    - start [tuple]: start of the next stage
+
+    """
+
+    if profile is None:
+        return None
+    entry = {'stage': stage, 'seconds': time.perf_counter() - start[0],
+        'rows': int(nrows)}
+    if start[1] is not None and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        entry['alloc_mb'] = (current - start[1])/2**20
+        entry['peak_mb'] = (peak - start[1])/2**20
+    profile['stages'].append(entry)
+
+    return profile_start(profile)
+
+def find_schema(logfile):
+    """
+    Schema of a log file: the file 'schema.json' in the directory of the
+    log file if there is one, otherwise the default schema SCHEMA.
+
+    Input:
+    - logfile [str]: path to the log file
+
+    Output:
+    - schema [str]: path to the schema file
+
+    """
+
+    schema = os.path.join(os.path.dirname(logfile), 'schema.json')
+
+    return schema if os.path.isfile(schema) else SCHEMA
+
+def load_schema(schema=None):
+    """
+    Read and check a schema, which describes the columns of a log file and
+    the sensor groups that are averaged. A schema is a JSON file with:
+    - "columns": names of the values on a line of the log file, starting
+      with the displacements "ver_rel" and "hor_rel", followed by the
+      sensors
+    - "groups": per average to compute, e.g. "RV_front", the sensors that
+      are averaged, as a list (equal weights) or as a dict with the weight
+      per sensor. The averages are added in this order.
+
+    Input:
+    - schema [str or dict]: path to the schema file, or the schema itself
+      (default = None: SCHEMA)
+
+    Output:
+    - schema [dict]
+
+    """
+
+    if schema is None:
+        schema = SCHEMA
+    if not isinstance(schema, dict):
+        with open(schema) as f:
+            schema = json.load(f)
+
+    columns = schema['columns']
+    if columns[:2] != ['ver_rel', 'hor_rel']:
+        raise ValueError('The first columns of a schema must be ver_rel and '
+            'hor_rel')
+    for name, sensors in schema['groups'].items():
+        unknown = [col for col in sensors if col not in columns[2:]]
+        if unknown:
+            raise ValueError('Unknown sensors in group ' + name + ': ' +
+                ', '.join(unknown))
+
+    return schema
+
+def group_matrix(schema):
+    """
+    Weights of the sensor groups of a schema as a matrix, so that all group
+    averages are computed at once, see group_means.
+
+    Input:
+    - schema [dict]: see load_schema
+
+    Output:
+    - weights [numpy array]: weight of every sensor (row, in the order of
+      schema['columns'][2:]) in every group (column)
+
+    """
+
+    sensors = schema['columns'][2:]
+    weights = np.zeros((len(sensors), len(schema['groups'])))
+    for j, members in enumerate(schema['groups'].values()):
+        if not isinstance(members, dict):
+            members = dict.fromkeys(members, 1.0)
+        for col, weight in members.items():
+            weights[sensors.index(col), j] = weight
+
+    return weights
+
+def group_means(values, weights):
+    """
+    Weighted average of groups of sensors, for all samples and groups at
+    once. Missing values (NaN) are left out; the average of a group of
+    which all values are missing is NaN.
+
+    Input:
+    - values [numpy array]: sensor values, one row per sample
+    - weights [numpy array]: weight of every sensor in every group, see
+      group_matrix
+
+    Output:
+    - means [numpy array]: average per sample (row) and group (column)
+
+    """
+
+    # einsum instead of a BLAS matrix product: BLAS may sum in a different
+    # order depending on the number of rows, so that the averages would
+    # depend (in the last digit) on the size of the blocks of data
+    valid = ~np.isnan(values)
+    if valid.all():
+        sums = np.einsum('ij,jk->ik', values, weights)
+        total = np.broadcast_to(weights.sum(axis=0), sums.shape)
+    else:
+        sums = np.einsum('ij,jk->ik', np.where(valid, values, 0), weights)
+        total = np.einsum('ij,jk->ik', valid.astype(float), weights)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, sums/total, np.nan)
+
+def parse_log(logfile):
+    """
+    Read a log file of the data logger into typed arrays. Every line holds
+    one sample: 'YYYY-mm-dd HH:MM:SS', followed by the sensor values and the
+    word 'END', all separated by tabs. Decimal commas are read as decimal
+    points.
+
+    Input:
+    - logfile [str]: path to the log file
+
+    Output:
+    - timestamps [numpy array]: logger clock time of each sample, in seconds
+      since 1970-01-01 00:00:00 (int64)
+    - values [numpy array]: sensor values, one row per sample (float)
+
+    """
+
+    with open(logfile, 'rb') as f:
+        raw = f.read()
+
+    return parse_log_bytes(raw)
+
+def parse_log_bytes(raw):
+    """
+    Parse the contents of a log file, see parse_log.
+
+    Input:
+    - raw [bytes]: complete lines of a log file
+
+    Output:
+    - timestamps [numpy array]: seconds since 1970-01-01 00:00:00 (int64)
+    - values [numpy array]: sensor values, one row per sample (float)
+
+    """
+
+    if not raw.strip():
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+
+    # The values are tab delimited, so a comma can only be a decimal comma
+    table = pd.read_csv(io.BytesIO(raw.replace(b',', b'.')), sep='\t',
+        header=None, dtype={0: str}, engine='c')
+
+    timestamps = pd.to_datetime(table[0], format='%Y-%m-%d %H:%M:%S')
+    timestamps = timestamps.values.astype('datetime64[s]').astype(np.int64)
+
+    # Drop the datetime column and the closing 'END' column
+    values = table.iloc[:, 1:-1].to_numpy(dtype=float)
+
+    return timestamps, values
+
 def correct_jump(df, jump_day, jump_size, direction):
     """
     Correct for discontinuities due to reset of device.
@@ -21,144 +252,238 @@ def correct_jump(df, jump_day, jump_size, direction):
 
     """
 
-    x_new = df.copy()[direction + '_rel'].values
+    x_new = df[direction + '_rel'].values.copy()
     x_new[df['days_diff'].values > jump_day] = x_new[df['days_diff'].values
         > jump_day] + jump_size
     df[direction + '_rel'] = x_new
 
     return df
 
-def data2df(do_correct=True, be_verbose=False):
+def find_jumps(rel, drel, cut):
     """
-    Read comma delimited log file into dataframe & clean data.
-    This function is tailored to the specific data file 'log_20220315.csv'
+    Find the samples at which the device was reset.
 
     Input:
-    -   do_correct_shifts [bool].
-        Set to True for data analysis (default), or to False for inspection
-        of original data (not corrected for shifts due to reset of devices)
+    - rel [numpy array]: relative displacement (mm)
+    - drel [numpy array]: change in displacement w.r.t. the previous sample
+    - cut [float]: minimal size of the jump, and maximal distance from zero
+      of the displacement directly after the reset (mm)
+
+    Output:
+    - idx [numpy array]: row indices of the first sample after each reset
+
+    """
+
+    return np.flatnonzero((np.abs(drel) > cut) & (np.abs(rel) < cut))
+
+def jump_offsets(days, jump_days, jump_sizes):
+    """
+    Cumulative correction for a set of device resets. Equivalent to calling
+    correct_jump once for every reset, but done in a single pass.
+
+    Input:
+    - days [numpy array]: time of each sample (days)
+    - jump_days [numpy array]: moments on which jumps occur (days)
+    - jump_sizes [numpy array]: sizes of the jumps (same units as displacement)
+
+    Output:
+    - offsets [numpy array]: correction to add to the displacement of each
+      sample
+
+    """
+
+    order = np.argsort(jump_days, kind='stable')
+    cumsize = np.concatenate(([0.0], np.cumsum(jump_sizes[order])))
+
+    # Number of jumps that occurred strictly before each sample
+    njumps = np.searchsorted(jump_days[order], days, side='left')
+
+    return cumsize[njumps]
+
+def new_state():
+    """
+    State of the cleaning procedure before any data has been read. The state
+    holds everything that clean_data needs to continue with the next block
+    of samples: the number of samples read so far, the first and the last
+    sample, the resets found so far and the baseline used to rebase the
+    data. It only contains plain numbers and lists, so it can be stored as
+    JSON.
+
+    Output:
+    - state [dict]
+
+    """
+
+    return {'nrows': 0, 'first_time': None, 'max_raw_time': None,
+        'prev': None,
+        'jumps': {'ver': [[], []], 'hor': [[], []]}, 'baseline': None}
+
+def to_standard_time(timestamps, state, tz=None):
+    """
+    Convert the local clock time of the logger to standard (winter) time,
+    so that the time runs continuously over any number of summer time
+    transitions. Samples in the hour that occurs twice when the clock is set
+    back are recognised from the data: the first pass through the hour is
+    summer time, samples that are not later than an earlier sample are
+    winter time.
+
+    Input:
+    - timestamps [numpy array]: logger clock time (seconds since 1970)
+    - state [dict]: cleaning state, see new_state (updated)
+    - tz [str]: time zone of the logger clock, e.g. 'Europe/Amsterdam'. If
+      None, the clock is assumed to run continuously (default = None)
+
+    Output:
+    - timestamps [numpy array]: standard time (seconds since 1970)
+
+    """
+
+    if tz is None or len(timestamps) == 0:
+        return timestamps
+
+    # Latest time before each sample, including the previous blocks
+    last = timestamps[0] - 1 if state['max_raw_time'] is None \
+        else state['max_raw_time']
+    latest = np.maximum.accumulate(np.concatenate(([last], timestamps)))
+    state['max_raw_time'] = int(latest[-1])
+    first_pass = timestamps > latest[:-1]
+
+    local = pd.DatetimeIndex(timestamps.astype('datetime64[s]').astype(
+        'datetime64[ns]'))
+    utc = local.tz_localize(tz, ambiguous=first_pass,
+        nonexistent='shift_forward').asi8 // 10**9
+
+    # The standard time offset is the smallest offset from UTC in the year
+    year = local[0].year
+    offset = min(pd.Timestamp(year, 1, 1).tz_localize(tz).utcoffset(),
+        pd.Timestamp(year, 7, 1).tz_localize(tz).utcoffset())
+
+    return utc + int(offset.total_seconds())
+
+def clean_data(timestamps, values, state=None, do_correct=True,
+        be_verbose=False, tz=TIMEZONE, schema=None, compact=False,
+        keep_columns=(), profile=None):
+    """
+    Convert parsed log data into a dataframe & clean data. The data can be
+    passed in consecutive blocks of samples, by passing the state that is
+    returned by one call to the next. The concatenated output is then the
+    same as when all data is passed at once.
+
+    Input:
+    -   timestamps [numpy array]: logger clock time (seconds since 1970),
+        see parse_log
+    -   values [numpy array]: sensor values, one row per sample
+    -   state [dict]. Cleaning state after the previous block, or None for
+        the first block (default = None). Updated in place.
+    -   do_correct [bool]. Correct for shifts due to reset of devices, see
+        data2df (default = True)
     -   be_verbose [bool]. If True, print irregularities in the data and/or
         checks if cleaning was carried out correctly (default = False)
+    -   tz [str]. Time zone of the logger clock, see to_standard_time
+        (default = TIMEZONE)
+    -   schema [str or dict]. Columns of the log file and the sensor groups
+        to average, see load_schema (default = None: SCHEMA)
+    -   compact [bool]. Reduce the memory use: the temperature and RV
+        columns of the individual sensors are stored as float32, and the
+        columns in OPTIONAL_COLUMNS are left out (default = False)
+    -   keep_columns [list of str]. Columns of OPTIONAL_COLUMNS to keep in
+        compact mode (default = ())
+    -   profile [dict]. If given, the wall time, number of rows and memory
+        of every stage are added to profile['stages'], see profile_stage
+        (default = None)
 
     Output:
     - df [pandas dataframe]: dataframe with leather displacement data
+    - state [dict]: cleaning state after this block
 
     """
 
-    # Data file, originally space delimited, converted to comma delimited.
-    logfile = '../data/log_20220315.csv'
-    data = np.genfromtxt(logfile, dtype='str').T
-    ncols = len(data)
-    nrows = len(data[0])
-
-    # Correct notation for decimals
-    datetime = []
-    for i in range(nrows):
-        datetime.append(data[0,i] + ' ' + data[1,i])
-        for j in range(ncols-2):
-            data[2+j,i].replace(",", ".")
-    data = data[2:-1].astype(float)
+    start = profile_start(profile)
+    if state is None:
+        state = new_state()
 
-    # Assign column names
+    # The columns and the sensor groups that are averaged, e.g. the sensors
+    # hanging in front and behind the leather, are read from the schema.
     # RV = Relative Humidity (procent) (from Dutch: Relatieve Vochtigheid)
-    # T = Temperature (Celcius):
-    colnames = ['ver_rel', 'hor_rel',
-            'T1', 'RV1', 'T2', 'RV2', 'T3', 'RV3', 'T4', 'RV4',
-            'T5', 'RV5', 'T6', 'RV6', 'T7', 'RV7', 'T8', 'RV8']
-
-    # Defines sensors hanging in front and behind the leather
-    T_front = ['T1', 'T4', 'T7']
-    RV_front = ['RV1', 'RV4', 'RV7']
-
-    T_back = ['T2', 'T3', 'T5', 'T6', 'T7']
-    RV_back = ['RV2', 'RV3', 'RV5', 'RV6', 'RV7']
-
-    # Group all RV and T columns
-    RVcollist = []
-    Tcollist = []
-    for acol in colnames:
-        if 'RV' in acol:
-            RVcollist.append(acol)
-        if 'T' in acol:
-            Tcollist.append(acol)
-
-    # Group all RV and T columns separate for the sensors hanging in front
-    # and behind the leather
-    RVcollist_front = []
-    RVcollist_back = []
-    Tcollist_front = []
-    Tcollist_back = []
-    for acol in colnames:
-        if acol in T_front:
-            Tcollist_front.append(acol)
-        elif acol in RV_front:
-            RVcollist_front.append(acol)
-        elif acol in T_back:
-            Tcollist_back.append(acol)
-        elif acol in RV_back:
-            RVcollist_back.append(acol)
-
-    # Create dataframe
-    df = pd.DataFrame(data.T, columns=colnames)
+    # T = Temperature (Celcius)
+    schema = load_schema(schema)
+    colnames = schema['columns']
+
+    # Create dataframe, rows are numbered from the start of the log file.
+    # In compact mode the temperature and RV columns are stored as float32.
+    rows = np.arange(state['nrows'], state['nrows'] + len(timestamps))
+    values = values.reshape(len(timestamps), len(colnames))
+    if compact:
+        df = pd.DataFrame(values[:, 2:].astype(np.float32),
+            columns=colnames[2:], index=rows)
+        df.insert(0, 'hor_rel', values[:, 1])
+        df.insert(0, 'ver_rel', values[:, 0])
+    else:
+        df = pd.DataFrame(values, columns=colnames, index=rows)
+
+    def keep(col):
+        return not compact or col in keep_columns
 
     # Convert time units to 'days_diff' = number of days since
     # start of measurements
-    df['datetime_raw'] = datetime
-    df['datetime'] = pd.to_datetime(df['datetime_raw'],
-        format='%Y-%m-%d %H:%M:%S')
-
-    # Make list of indices that contain summer time values. Remove the last two
-    # values (that are the duplicates, as the last two are winter time again)
-    summer = (df['datetime']>pd.Timestamp(2021,3,28,2,30,0)) & \
-        (df['datetime']<pd.Timestamp(2021,10,31,3,0,0))
-    summer_idx = [i for i, x in enumerate(summer) if x]
-    summer[summer_idx[-2]] = False
-    summer[summer_idx[-1]] = False
+    if keep('datetime_raw'):
+        df['datetime_raw'] = np.char.replace(np.datetime_as_string(
+            timestamps.astype('datetime64[s]')), 'T', ' ')
+    start = profile_stage(profile, start, 'frame', len(df))
 
     # Set all datatimes to winter time so that the time runs continously
-    df['datetime'][summer] = df['datetime'][summer] - pd.Timedelta("1 hour")
+    raw_timestamps = timestamps
+    timestamps = to_standard_time(timestamps, state, tz)
+    df['datetime'] = timestamps.astype('datetime64[s]').astype('datetime64[ns]')
 
     if be_verbose:
         print('=== Check summer time corrections === ')
-        print(df[940:950])
-        print(df[11405:11415])
+        shift = timestamps - raw_timestamps
+        for i in np.flatnonzero(np.diff(shift)):
+            print(df.iloc[max(i-5, 0):i+5])
+    start = profile_stage(profile, start, 'dst', len(df))
 
     # Measure time in days and minutes from start of measurement
-    first_day = df['datetime'].iloc[0]
-    df['minutes_diff'] = (df['datetime'] - first_day).dt.total_seconds()/60.0
-    df['days_diff'] = df['minutes_diff']/(24*60.0)
+    if state['first_time'] is None:
+        state['first_time'] = int(timestamps[0])
+    minutes = (timestamps - state['first_time'])/60.0
+    days = minutes/(24*60.0)
+    if keep('minutes_diff'):
+        df['minutes_diff'] = minutes
+    df['days_diff'] = days
 
     # Convert relative shift to mm, take negative value so that expansion
     # corresponds with an increasing number
     df['ver_rel'] = -df['ver_rel']*10
     df['hor_rel'] = -df['hor_rel']*10
 
-    # Take average RV and T over axis=1, that is, take the mean per row over
-    # the columns in RVcollist and Tcollist
-    df['RV_avg'] = df[RVcollist].mean(axis=1)
-    df['RV_front'] = df[RVcollist_front].mean(axis=1)
-    df['RV_back'] = df[RVcollist_back].mean(axis=1)
-
-    df['T_avg'] = df[Tcollist].mean(axis=1)
-    df['T_front'] = df[Tcollist_front].mean(axis=1)
-    df['T_back'] = df[Tcollist_back].mean(axis=1)
+    # Take the average RV and T per group of sensors, for all groups at once
+    # with a matrix product. The averages are computed from the original
+    # values, also in compact mode.
+    means = group_means(values[:, 2:], group_matrix(schema))
+    for name, mean in zip(schema['groups'], means.T):
+        df[name] = mean
+    start = profile_stage(profile, start, 'averages', len(df))
 
     # Compute the shifts per sampling interval, essentially the derivative in
     # time. This is for correcting for the jumps created by device reset.
-    vertical_strech_diff = df['ver_rel'].values[1:] - df['ver_rel'].values[:-1]
-    horizontal_strech_diff = df['hor_rel'].values[1:] - df['hor_rel'].values[:-1]
-    time_avg = 0.5*(df['days_diff'].values[1:] + df['days_diff'].values[:-1])
-
-    vertical_strech_diff = np.concatenate((np.array([0.0]),
-        vertical_strech_diff))
-    horizontal_strech_diff = np.concatenate((np.array([0.0]),
-        horizontal_strech_diff))
-
-    df['dver_raw'] = vertical_strech_diff
-    df['dhor_raw'] = horizontal_strech_diff
-
-    diff_mins = df['minutes_diff'].values[1:] - df['minutes_diff'].values[:-1]
-    df['interval_mins'] = np.concatenate((np.array([0]), diff_mins))
+    # The values of the previous sample (the last sample of the previous
+    # block) are prepended, so that the first sample has a shift of zero.
+    ver = df['ver_rel'].values
+    hor = df['hor_rel'].values
+    if state['prev'] is None:
+        state['prev'] = [float(ver[0]), float(hor[0]), minutes[0], days[0]]
+    prev_ver, prev_hor, prev_minutes, prev_days = state['prev']
+
+    dver = np.diff(ver, prepend=prev_ver)
+    dhor = np.diff(hor, prepend=prev_hor)
+    if keep('dver_raw'):
+        df['dver_raw'] = dver
+    if keep('dhor_raw'):
+        df['dhor_raw'] = dhor
+    if keep('interval_mins'):
+        df['interval_mins'] = np.diff(minutes, prepend=prev_minutes)
+    start = profile_stage(profile, start, 'differences', len(df))
 
     # Correct for jumps due to device reset in the data
     if do_correct:
@@ -167,63 +492,148 @@ def data2df(do_correct=True, be_verbose=False):
             print('Datetime'.ljust(20), 'Direction'.ljust(12),
                 'Reset val (mm)'.ljust(18), 'Jump size (mm)')
 
-        ver_cut = 0.25
-        hor_cut = 0.15
-
-        sh_ver = []
-        sh_hor = []
-        for i in range(len(df)):
-            if (np.abs(df['dver_raw'].iloc[i]) > ver_cut and
-                    np.abs(df['ver_rel'].iloc[i]) < ver_cut):
-                sh_ver.append([df['days_diff'].iloc[i-1],
-                    df['ver_rel'].iloc[i-1]])
-                if be_verbose:
+        # A reset shows up as a large step towards (close to) zero. The
+        # value just before the reset is added to all later samples, which
+        # is done for all resets at once as a cumulative step function.
+        days_before = np.concatenate(([prev_days], days[:-1]))
+        for direction, name, cut, rel, drel, prev_rel in (
+                ('ver', 'Vertical', VER_CUT, ver, dver, prev_ver),
+                ('hor', 'Horizontal', HOR_CUT, hor, dhor, prev_hor)):
+            idx = find_jumps(rel, drel, cut)
+            rel_before = np.concatenate(([prev_rel], rel[:-1]))
+
+            jumps = state['jumps'][direction]
+            jumps[0].extend(days_before[idx].tolist())
+            jumps[1].extend(rel_before[idx].tolist())
+            df[direction + '_rel'] = rel + jump_offsets(days,
+                np.array(jumps[0]), np.array(jumps[1]))
+
+            if be_verbose:
+                for i in idx:
                     print(str(df['datetime'].iloc[i]).ljust(20),
-                        'Vertical'.ljust(12),
-                        str(round(df['ver_rel'].iloc[i],2)).ljust(18),
-                        str(round(df['dver_raw'].iloc[i],2)))
-        for i in range(len(df)):
-            if (np.abs(df['dhor_raw'].iloc[i]) > hor_cut and
-                    np.abs(df['hor_rel'].iloc[i]) < hor_cut):
-                sh_hor.append([df['days_diff'].iloc[i-1],
-                    df['hor_rel'].iloc[i-1]])
-                if be_verbose:
-                    print(str(df['datetime'].iloc[i]).ljust(20),
-                        'Horizontal'.ljust(12),
-                        str(round(df['hor_rel'].iloc[i],2)).ljust(18),
-                        str(round(df['dhor_raw'].iloc[i],2)))
-
-        for shiftinfo in sh_ver:
-            df = correct_jump(df, shiftinfo[0], shiftinfo[1], 'ver')
-        for shiftinfo in sh_hor:
-            df = correct_jump(df, shiftinfo[0], shiftinfo[1], 'hor')
+                        name.ljust(12), str(round(rel[i],2)).ljust(18),
+                        str(round(drel[i],2)))
 
         if be_verbose:
             print("Correcting for jumps due to device reset")
-            print('Number of ver jumps:', len(sh_ver))
-            print('Number of hor jumps:', len(sh_hor))
+            print('Number of ver jumps:', len(state['jumps']['ver'][0]))
+            print('Number of hor jumps:', len(state['jumps']['hor'][0]))
+        start = profile_stage(profile, start, 'jumps', len(df))
+
+    state['prev'] = [float(ver[-1]), float(hor[-1]), minutes[-1], days[-1]]
+    state['nrows'] += len(df)
 
     if do_correct:
-        # Drop first 14 rows, where the time intervals are not regular
-        ndrop = 14
-        df = df.iloc[ndrop: , :]
-        df['days_diff'] = df['days_diff'] - df['days_diff'].iloc[0]
-        df['minutes_diff'] = df['minutes_diff'] - df['minutes_diff'].iloc[0]
-        df['ver_rel'] = df['ver_rel'] - df['ver_rel'].iloc[0]
-        df['hor_rel'] = df['hor_rel'] - df['hor_rel'].iloc[0]
-        df.index = range(len(df))
-
-        # Setting days_diff = 0 at the first time it is 00:00h (midnight)
-        df['days_diff'] = df['days_diff'] - df['days_diff'].values[16]
+        # The first NDROP rows, where the time intervals are not regular, are
+        # dropped. The remaining data is set relative to the first row that
+        # is kept, and days_diff = 0 at the first time it is 00:00h
+        # (midnight). These reference values are taken from the first block.
+        if state['baseline'] is None:
+            if len(df) <= NDROP + MIDNIGHT_ROW:
+                raise ValueError('The first block needs at least ' +
+                    str(NDROP + MIDNIGHT_ROW + 1) + ' samples')
+            state['baseline'] = {
+                'ver_rel': float(df['ver_rel'].values[NDROP]),
+                'hor_rel': float(df['hor_rel'].values[NDROP]),
+                'minutes_diff': float(minutes[NDROP]),
+                'days_diff': float(days[NDROP]),
+                'midnight': float(days[NDROP + MIDNIGHT_ROW] - days[NDROP])}
+        baseline = state['baseline']
+
+        # The rows themselves are dropped together with the rows with a high
+        # RV below, so that the data is copied only once
+        df['days_diff'] = df['days_diff'] - baseline['days_diff']
+        if 'minutes_diff' in df:
+            df['minutes_diff'] = df['minutes_diff'] - \
+                baseline['minutes_diff']
+        df['ver_rel'] = df['ver_rel'] - baseline['ver_rel']
+        df['hor_rel'] = df['hor_rel'] - baseline['hor_rel']
+        df.index = df.index - NDROP
+
+        df['days_diff'] = df['days_diff'] - baseline['midnight']
+        start = profile_stage(profile, start, 'trim', len(df))
+
+    kept = df.index.values >= 0
+    rv = df['RV_avg'].values
 
     # Remove data points with very high values of RV. Before throwing them
     # out print them (if verbose)
     if be_verbose:
         print('\n=== Large RV instances ===')
-        df_wrongRV = df.copy()[df['RV_avg'] > 100]
+        df_wrongRV = df[kept & (rv > MAX_RV)]
         print(df_wrongRV)
 
     # Only keep rows with RV values below 100%.
-    df = df.copy()[df['RV_avg'] < 100]
+    df = df.take(np.flatnonzero(kept & (rv < MAX_RV)))
+    profile_stage(profile, start, 'rh_filter', len(df))
+
+    return df, state
+
+def data2df(do_correct=True, be_verbose=False, logfile=LOGFILE, tz=TIMEZONE,
+        schema=None, compact=False, keep_columns=(), profile=None):
+    """
+    Read tab delimited log file into dataframe & clean data.
+    This function is tailored to the specific data file 'log_20220315.csv'
+
+    Input:
+    -   do_correct_shifts [bool].
+        Set to True for data analysis (default), or to False for inspection
+        of original data (not corrected for shifts due to reset of devices)
+    -   be_verbose [bool]. If True, print irregularities in the data and/or
+        checks if cleaning was carried out correctly (default = False)
+    -   logfile [str]. Path to the log file (default = LOGFILE)
+    -   tz [str]. Time zone of the logger clock, used to convert summer time
+        to winter time. None if the clock does not switch to summer time
+        (default = TIMEZONE)
+    -   schema [str or dict]. Columns of the log file and the sensor groups
+        to average, see load_schema (default = None: the schema found by
+        find_schema)
+    -   compact [bool]. Store the temperature and RV columns as float32 and
+        leave out the derived columns that the figures do not use, see
+        clean_data. For long records from many sensors. (default = False)
+    -   keep_columns [list of str]. Derived columns to keep in compact mode,
+        see clean_data (default = ())
+    -   profile [dict]. If given, a report of the processing is added to
+        it: per stage the wall time, number of rows and allocated memory
+        (see profile_stage), and the totals. The memory is traced with
+        tracemalloc, which makes the processing somewhat slower. The report
+        can be written as JSON. (default = None)
+
+    Output:
+    - df [pandas dataframe]: dataframe with leather displacement data
+
+    """
+
+    if schema is None:
+        schema = find_schema(logfile)
+
+    if profile is None:
+        timestamps, values = parse_log(logfile)
+        df, state = clean_data(timestamps, values, do_correct=do_correct,
+            be_verbose=be_verbose, tz=tz, schema=schema, compact=compact,
+            keep_columns=keep_columns)
+        return df
+
+    profile['logfile'] = logfile
+    profile['stages'] = []
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        start = profile_start(profile)
+        timestamps, values = parse_log(logfile)
+        profile_stage(profile, start, 'parse', len(timestamps))
+        df, state = clean_data(timestamps, values, do_correct=do_correct,
+            be_verbose=be_verbose, tz=tz, schema=schema, compact=compact,
+            keep_columns=keep_columns, profile=profile)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    profile['seconds'] = sum(entry['seconds'] for entry in profile['stages'])
+    profile['peak_mb'] = max(entry.get('peak_mb', 0) for entry in
+        profile['stages'])
+    profile['rows_in'] = len(timestamps)
+    profile['rows_out'] = len(df)
 
     return df
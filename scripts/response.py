@@ -0,0 +1,333 @@
+# Fit models of the response of the displacement to the relative humidity
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import read_data
+import data_store
+import lag
+
+# Default grid of time constants (hours), and of the initial states of the
+# models as an offset from the first relative humidity (%)
+TAUS = np.geomspace(0.5, 720, 25)
+INITIAL = (-10.0, 0.0, 10.0)
+
+MODELS = ('first_order', 'asymmetric', 'two_timescale')
+
+def response_filter(u, alpha_up, alpha_down, initial, out=None):
+    """
+    Exponential (first-order) response of a set of models to a regularly
+    sampled series u, e.g. the relative humidity. The state s of every model
+    relaxes towards u:
+        s[i] = s[i-1] + alpha*(u[i] - s[i-1]),  alpha = 1 - exp(-dt/tau)
+    where the time constant tau can differ for rising u (alpha_up:
+    adsorption) and falling u (alpha_down: desorption). The recursion runs
+    over the samples once, for all models at the same time, so the cost is
+    O(n) numpy operations on arrays with one value per model. Where u is
+    NaN the state is held.
+
+    Input:
+    - u [numpy array]: driving series, n samples
+    - alpha_up, alpha_down [numpy array]: step factor of every model
+    - initial [numpy array]: state of every model before the first sample
+    - out [numpy array]: array of shape (n, number of models) to write the
+      states to (default = None: a new array)
+
+    Output:
+    - s [numpy array]: state after every sample (rows) of every model
+      (columns)
+
+    """
+
+    alpha_up = np.atleast_1d(np.asarray(alpha_up, dtype=float))
+    alpha_down = np.atleast_1d(np.asarray(alpha_down, dtype=float))
+    s = np.array(np.broadcast_to(initial, alpha_up.shape), dtype=float)
+    if out is None:
+        out = np.empty((len(u), len(s)))
+    symmetric = np.array_equal(alpha_up, alpha_down)
+
+    d = np.empty_like(s)
+    for i, ui in enumerate(u):
+        if ui == ui:
+            np.subtract(ui, s, out=d)
+            if symmetric:
+                d *= alpha_up
+            else:
+                d *= np.where(d > 0, alpha_up, alpha_down)
+            s += d
+        out[i] = s
+
+    return out
+
+def response_stats(u, y, alpha_up, alpha_down, initial, gram=False,
+        block_size=2**20):
+    """
+    Sums over the valid samples that determine the least-squares fits of
+    y = offset + gain*s for every model (see response_filter). The states
+    are computed in blocks of samples, so that they are never all in
+    memory at once.
+
+    Input:
+    - u [numpy array]: driving series, n samples
+    - y [numpy array]: responses, shape (n, number of responses); samples
+      where one of them is NaN are left out of the sums
+    - alpha_up, alpha_down, initial: the models, see response_filter
+    - gram [bool]: also sum the products of the states of all pairs of
+      models, for fits with several time scales (default = False)
+    - block_size [int]: number of values (samples times models) computed
+      at once (default = 2**20)
+
+    Output:
+    - stats [dict]: the number of valid samples ('n'), per model the sums
+      of s ('s') and s**2 ('ss'), the sums of s*y per model and response
+      ('sy') and, if gram is True, the sums of the products of the states
+      ('gram')
+
+    """
+
+    nmodels = len(np.atleast_1d(alpha_up))
+    valid = ~np.isnan(y).any(axis=1)
+    y = np.where(valid[:, None], y, 0.0)
+    stats = {'n': int(valid.sum()), 's': np.zeros(nmodels),
+        'ss': np.zeros(nmodels), 'sy': np.zeros((nmodels, y.shape[1]))}
+    if gram:
+        stats['gram'] = np.zeros((nmodels, nmodels))
+
+    nrows = max(block_size//nmodels, 1)
+    buffer = np.empty((nrows, nmodels))
+    state = initial
+    for i in range(0, len(u), nrows):
+        rows = slice(i, min(i + nrows, len(u)))
+        s = response_filter(u[rows], alpha_up, alpha_down, state,
+            buffer[:rows.stop - i])
+        state = s[-1]
+        s = s[valid[rows]]
+        stats['s'] += s.sum(axis=0)
+        stats['ss'] += np.einsum('ij,ij->j', s, s)
+        stats['sy'] += s.T @ y[rows][valid[rows]]
+        if gram:
+            stats['gram'] += s.T @ s
+
+    return stats
+
+def fit_response(df, x='RV_avg', ys=('ver_rel', 'hor_rel'), interval='30min',
+        taus=TAUS, initial=INITIAL, nprocs=1):
+    """
+    Fit models of the response of the displacement (or another quantity) to
+    the relative humidity, on a regular time grid:
+    - 'first_order': y = offset + gain*s, where s follows x with a single
+      time constant (tau1)
+    - 'asymmetric': as first_order, with a time constant for rising x
+      (adsorption, tau1) and one for falling x (desorption, tau2)
+    - 'two_timescale': y = offset + gain1*s1 + gain2*s2, with a fast (tau1)
+      and a slow (tau2) first-order response
+    The time constants and the initial states are searched on a grid; the
+    gains and offset are fitted by least squares for every point of the
+    grid, from sums that are accumulated in a single pass over the data
+    (see response_stats). The points of the grid are divided over nprocs
+    processes.
+
+    Input:
+    - df [pandas dataframe]: cleaned data, see read_data.data2df
+    - x [str]: driving quantity (default = 'RV_avg')
+    - ys [list of str]: responding quantities
+    - interval [str]: interval of the regular grid (default = '30min')
+    - taus [list of float]: time constants to search (hours)
+    - initial [list of float]: initial states to search, as an offset from
+      the first value of x
+    - nprocs [int]: number of worker processes (default = 1: no workers)
+
+    Output:
+    - params [pandas dataframe]: per model and quantity y the time
+      constants ('tau1_h', 'tau2_h'), gains per unit of x ('gain1',
+      'gain2'), the offset, the initial states ('initial1', 'initial2'),
+      the root-mean-square residual ('rmse') and the coefficient of
+      determination ('r2')
+    - df_fit [pandas dataframe]: x and the quantities y on the regular
+      grid, and per model the fitted values ('<y>_<model>') and residuals
+      ('<y>_<model>_res')
+
+    """
+
+    ys = list(ys)
+    grid = lag.resample_regular(df, [x] + ys, interval)
+    hours = pd.Timedelta(interval)/pd.Timedelta('1h')
+    taus = np.asarray(taus, dtype=float)
+    initial = np.asarray(initial, dtype=float)
+    alphas = 1 - np.exp(-hours/taus)
+
+    # Centre the series, so that the sums do not lose precision
+    u = grid[x].values
+    x_mean = np.nanmean(u)
+    u = u - x_mean
+    first = u[np.flatnonzero(~np.isnan(u))[0]]
+    y = grid[ys].values
+    valid = ~np.isnan(y).any(axis=1)
+    y_mean = y[valid].mean(axis=0)
+    y = y - y_mean
+
+    # All combinations of (tau up, tau down, initial state); the models
+    # with the same time constant up and down are the first-order models
+    i_up, i_down, i_init = [v.ravel() for v in np.meshgrid(
+        np.arange(len(taus)), np.arange(len(taus)), np.arange(len(initial)),
+        indexing='ij')]
+    symmetric = np.flatnonzero(i_up == i_down)
+    other = np.flatnonzero(i_up != i_down)
+    tasks = [(symmetric, True)] + [(part, False) for part in
+        np.array_split(other, max(nprocs, 1)) if len(part)]
+    task_args = [(u, y, alphas[i_up[models]], alphas[i_down[models]],
+        first + initial[i_init[models]], gram) for models, gram in tasks]
+
+    if nprocs == 1:
+        results = [response_stats(*args) for args in task_args]
+    else:
+        with ProcessPoolExecutor(max_workers=nprocs) as pool:
+            futures = [pool.submit(response_stats, *args)
+                for args in task_args]
+            results = [future.result() for future in futures]
+
+    n = results[0]['n']
+    sums = {key: np.empty((len(i_up),) + results[0][key].shape[1:])
+        for key in ('s', 'ss', 'sy')}
+    for (models, gram), stats in zip(tasks, results):
+        for key in sums:
+            sums[key][models] = stats[key]
+
+    # Single-state models: closed-form least squares per model and y
+    s_mean = sums['s']/n
+    var_s = np.maximum(sums['ss']/n - s_mean**2, 1e-300)
+    cov = sums['sy']/n
+    var_y = (y[valid]**2).mean(axis=0)
+    gain = cov/var_s[:, None]
+    sse = n*(var_y - cov*gain)
+
+    params = []
+    fits = {}
+    for j, col in enumerate(ys):
+        for model, candidates in (('first_order', symmetric),
+                ('asymmetric', np.arange(len(i_up)))):
+            best = candidates[np.argmin(sse[candidates, j])]
+            g = gain[best, j]
+            params.append({'model': model, 'column': col,
+                'tau1_h': taus[i_up[best]],
+                'tau2_h': taus[i_down[best]] if model == 'asymmetric'
+                    else np.nan,
+                'gain1': g, 'gain2': np.nan,
+                'offset': y_mean[j] - g*s_mean[best] - g*x_mean,
+                'initial1': initial[i_init[best]], 'initial2': np.nan,
+                'sse': sse[best, j]})
+            fits[col, model] = [(g, best)]
+
+    # Two time scales: least squares with two states of the first-order
+    # models and an offset, solved for all pairs at once from their sums
+    gram = results[0]['gram']
+    nsym = len(symmetric)
+    A = np.empty((nsym + 1, nsym + 1))
+    A[0, 0] = n
+    A[0, 1:] = A[1:, 0] = sums['s'][symmetric]
+    A[1:, 1:] = gram
+    b = np.vstack([np.zeros((1, len(ys))), sums['sy'][symmetric]])
+    fast, slow = np.meshgrid(np.arange(nsym), np.arange(nsym),
+        indexing='ij')
+    pairs = taus[i_up[symmetric]][fast] < taus[i_up[symmetric]][slow]
+    idx = np.stack([np.zeros(pairs.sum(), dtype=int), fast[pairs] + 1,
+        slow[pairs] + 1], axis=1)
+    coef = np.linalg.pinv(A[idx[:, :, None], idx[:, None, :]]) @ b[idx]
+    sse2 = n*var_y - np.sum(coef*b[idx], axis=1)
+    for j, col in enumerate(ys):
+        k = np.argmin(sse2[:, j])
+        c0, g1, g2 = coef[k, :, j]
+        m1, m2 = symmetric[idx[k, 1] - 1], symmetric[idx[k, 2] - 1]
+        params.append({'model': 'two_timescale', 'column': col,
+            'tau1_h': taus[i_up[m1]], 'tau2_h': taus[i_up[m2]],
+            'gain1': g1, 'gain2': g2,
+            'offset': y_mean[j] + c0 - (g1 + g2)*x_mean,
+            'initial1': initial[i_init[m1]], 'initial2': initial[i_init[m2]],
+            'sse': sse2[k, j]})
+        fits[col, 'two_timescale'] = [(g1, m1), (g2, m2)]
+
+    params = pd.DataFrame(params)
+    params['rmse'] = np.sqrt(np.maximum(params.pop('sse'), 0)/n)
+    params['r2'] = 1 - params['rmse']**2/params['column'].map(
+        dict(zip(ys, var_y)))
+    params = params.sort_values('column', key=lambda c: c.map(ys.index),
+        kind='stable', ignore_index=True)
+
+    # Fitted values and residuals of the best models
+    df_fit = grid.copy()
+    u = grid[x].values
+    for (col, model), terms in fits.items():
+        row = params[(params['model'] == model) & (params['column'] == col)]
+        fitted = np.full(len(u), row['offset'].iloc[0])
+        for g, m in terms:
+            fitted += g*response_filter(u, alphas[i_up[m]], alphas[i_down[m]],
+                u[np.flatnonzero(~np.isnan(u))[0]] + initial[i_init[m]])[:, 0]
+        df_fit[col + '_' + model] = fitted
+        df_fit[col + '_' + model + '_res'] = grid[col].values - fitted
+
+    return params, df_fit
+
+def fit_by_installation(df, **kwargs):
+    """
+    Run fit_response for every installation in combined data (see
+    batch.process_logs).
+
+    Input:
+    - df [pandas dataframe]: data with an 'installation' column
+    - kwargs: passed to fit_response
+
+    Output:
+    - params [pandas dataframe]: fitted models with an 'installation'
+      column
+    - df_fit [pandas dataframe]: fitted values and residuals with an
+      'installation' column
+
+    """
+
+    params = []
+    fits = []
+    for installation, group in df.groupby('installation', sort=False):
+        result = fit_response(group, **kwargs)
+        for table, results in zip(result, (params, fits)):
+            table.insert(0, 'installation', installation)
+            results.append(table)
+
+    return pd.concat(params, ignore_index=True), pd.concat(fits)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Fit models of the '
+        'response of the displacement to the relative humidity.')
+    parser.add_argument('logfile', nargs='?', default=read_data.LOGFILE,
+        help='log file (default: %(default)s)')
+    parser.add_argument('--interval', default='30min',
+        help='interval of the regular grid (default: %(default)s)')
+    parser.add_argument('--tau-min', type=float, default=TAUS[0],
+        help='shortest time constant in hours (default: %(default)s)')
+    parser.add_argument('--tau-max', type=float, default=TAUS[-1],
+        help='longest time constant in hours (default: %(default)s)')
+    parser.add_argument('--ntau', type=int, default=len(TAUS),
+        help='number of time constants, spaced logarithmically '
+        '(default: %(default)s)')
+    parser.add_argument('--nprocs', type=int, default=1,
+        help='number of worker processes (default: %(default)s)')
+    parser.add_argument('--output', default=None,
+        help='write the fitted values and residuals to this .csv file')
+    args = parser.parse_args(argv)
+
+    df = data_store.load_data(args.logfile, do_correct=True, compact=True)
+    params, df_fit = fit_response(df, interval=args.interval,
+        taus=np.geomspace(args.tau_min, args.tau_max, args.ntau),
+        nprocs=args.nprocs)
+    print(params.round(4).to_string(index=False))
+    if args.output is not None:
+        df_fit.to_csv(args.output)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# Rolling statistics over time windows, for irregularly sampled data
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import numpy as np
+import pandas as pd
+
+def window_starts(times, window):
+    """
+    Find, for each sample, the first sample of the time window that ends at
+    this sample. The window of a sample at time t is (t - window, t].
+
+    Input:
+    - times [numpy array]: non-decreasing times (int64 or float)
+    - window [same type as times]: length of the window
+
+    Output:
+    - starts [numpy array]: index of the first sample in each window
+
+    """
+
+    return np.searchsorted(times, times - window, side='right')
+
+def rolling_stats(times, values, windows, stats=('mean', 'std', 'min', 'max'),
+        min_periods=1, full_window=False, ddof=1):
+    """
+    Rolling statistics over time windows of several lengths. The windows are
+    defined in time rather than in number of samples, so they are correct
+    when the sampling interval varies or the data has gaps. The mean and
+    standard deviation of all windows are computed from the same cumulative
+    sums, in a single pass over the data; the minimum and maximum use the
+    time based rolling windows of pandas. NaN values are ignored.
+
+    Input:
+    - times [pandas series or numpy array]: non-decreasing times, either
+      datetimes (e.g. df['datetime']) or minutes (e.g. df['minutes_diff'])
+    - values [pandas dataframe]: columns for which to compute statistics
+    - windows [dict or list]: window lengths, as strings understood by
+      pandas.Timedelta (e.g. '6h', '1D', '30D'). A dict maps a name, used
+      in the output columns, to a length; for a list the length is the name.
+    - stats [list of str]: statistics to compute, out of 'mean', 'std',
+      'min' and 'max'
+    - min_periods [int]: minimal number of samples in a window, otherwise
+      the result is NaN (default = 1)
+    - full_window [bool]: if True, the result is NaN for windows that start
+      before the first sample (default = False)
+    - ddof [int]: delta degrees of freedom of the standard deviation
+      (default = 1, as in pandas)
+
+    Output:
+    - df_roll [pandas dataframe]: columns '<col>_roll_<name>_<stat>', with
+      the same index as values
+
+    """
+
+    if not isinstance(windows, dict):
+        windows = {w: w for w in windows}
+
+    # Times in nanoseconds (datetimes) or minutes (numbers)
+    times = np.asarray(times)
+    is_datetime = times.dtype.kind == 'M'
+    if is_datetime:
+        t = times.astype('datetime64[ns]').view(np.int64)
+    else:
+        t = times.astype(float)
+    index = pd.DatetimeIndex(t if is_datetime else
+        (t*60e9).astype(np.int64))
+
+    df_roll = pd.DataFrame(index=values.index)
+    for col in values.columns:
+        v = np.asarray(values[col], dtype=float)
+        valid = ~np.isnan(v)
+
+        # Subtract a typical value, to keep the cumulative sums accurate
+        ref = np.nanmean(v) if valid.any() else 0.0
+        x = np.where(valid, v - ref, 0.0)
+        cs_n = np.concatenate(([0], np.cumsum(valid)))
+        cs_x = np.concatenate(([0.0], np.cumsum(x)))
+        cs_xx = np.concatenate(([0.0], np.cumsum(x*x)))
+        series = pd.Series(v, index=index)
+
+        for name, window in windows.items():
+            length = pd.Timedelta(window)
+            length = length.value if is_datetime else \
+                length.total_seconds()/60.0
+            starts = window_starts(t, length)
+            ends = np.arange(1, len(t) + 1)
+
+            n = cs_n[ends] - cs_n[starts]
+            missing = n < max(min_periods, 1)
+            if full_window:
+                missing |= t - length < t[0]
+
+            prefix = col + '_roll_' + name + '_'
+            with np.errstate(invalid='ignore', divide='ignore'):
+                sx = cs_x[ends] - cs_x[starts]
+                mean = sx/n
+                if 'mean' in stats:
+                    df_roll[prefix + 'mean'] = np.where(missing, np.nan,
+                        mean + ref)
+                if 'std' in stats:
+                    sxx = cs_xx[ends] - cs_xx[starts]
+                    ss = sxx - sx*mean
+                    # Differences at the level of the rounding errors of the
+                    # cumulative sums are zero
+                    ss[ss <= 1e-14*cs_xx[ends]] = 0.0
+                    var = ss/(n - ddof)
+                    var[n <= ddof] = np.nan
+                    df_roll[prefix + 'std'] = np.where(missing, np.nan,
+                        np.sqrt(var))
+
+            for stat in ('min', 'max'):
+                if stat in stats:
+                    rolled = getattr(series.rolling(pd.Timedelta(window),
+                        min_periods=1), stat)().values
+                    df_roll[prefix + stat] = np.where(missing, np.nan, rolled)
+
+    return df_roll
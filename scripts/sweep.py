@@ -0,0 +1,224 @@
+# Sensitivity of the results to the constants of the cleaning procedure
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import sys
+import itertools
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import read_data
+import binning
+import fig8_40perc
+
+def prepare(logfile=read_data.LOGFILE, tz=read_data.TIMEZONE, schema=None):
+    """
+    Parse a log file once and compute everything of the cleaning that does
+    not depend on the swept constants (see read_data.clean_data): the
+    standard time, the displacements in mm and the average relative
+    humidity.
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - tz [str]: time zone of the logger clock (default = read_data.TIMEZONE)
+    - schema [str or dict]: schema of the log file (default = None: the
+      schema found by read_data.find_schema)
+
+    Output:
+    - data [dict]: per sample the 'datetime', the days since the first
+      sample ('days'), the displacements ('ver', 'hor', mm, not corrected)
+      and 'RV_avg'
+
+    """
+
+    if schema is None:
+        schema = read_data.find_schema(logfile)
+    schema = read_data.load_schema(schema)
+
+    timestamps, values = read_data.parse_log(logfile)
+    values = values.reshape(len(timestamps), len(schema['columns']))
+    timestamps = read_data.to_standard_time(timestamps, read_data.new_state(),
+        tz)
+    means = read_data.group_means(values[:, 2:],
+        read_data.group_matrix(schema))
+
+    return {'datetime': timestamps.astype('datetime64[s]'),
+        'days': (timestamps - timestamps[0])/60.0/(24*60.0),
+        'ver': -values[:, 0]*10, 'hor': -values[:, 1]*10,
+        'RV_avg': means[:, list(schema['groups']).index('RV_avg')]}
+
+def correct_resets(rel, days, cut):
+    """
+    Displacement corrected for the resets of the device, as in
+    read_data.clean_data, for a given minimal jump size.
+
+    Input:
+    - rel [numpy array]: displacement (mm), not corrected
+    - days [numpy array]: time of each sample (days)
+    - cut [float]: minimal jump regarded as a reset (mm), see
+      read_data.find_jumps
+
+    Output:
+    - rel [numpy array]: corrected displacement (mm)
+    - nresets [int]: number of resets
+
+    """
+
+    idx = read_data.find_jumps(rel, np.diff(rel, prepend=rel[0]), cut)
+    days_before = np.concatenate((days[:1], days[:-1]))
+    rel_before = np.concatenate((rel[:1], rel[:-1]))
+
+    return rel + read_data.jump_offsets(days, days_before[idx],
+        rel_before[idx]), len(idx)
+
+def sweep_cuts(data, ver_cut, hor_cut, ndrops, midnight_rows, max_rvs,
+        sizes, nsig=2):
+    """
+    Results of the cleaning for one pair of reset thresholds and all
+    combinations of the other constants. The resets are corrected once;
+    the other constants only select rows or scale the results.
+
+    Input:
+    - data [dict]: see prepare
+    - ver_cut, hor_cut [float]: minimal vertical and horizontal jump
+      regarded as a reset (mm)
+    - ndrops [list of int]: numbers of rows dropped at the start
+    - midnight_rows [list of int]: first row at 00:00h after the dropped rows
+    - max_rvs [list of float]: only rows with an average RV below this are
+      kept
+    - sizes [list of tuples]: horizontal and vertical size of the leather
+      (mm)
+    - nsig [int]: number of standard deviations of the spread per bin, as
+      printed by fig8_40perc (default = 2)
+
+    Output:
+    - results [list of dict]: one row per combination, see sweep
+
+    """
+
+    ver, nver = correct_resets(data['ver'], data['days'], ver_cut)
+    hor, nhor = correct_resets(data['hor'], data['days'], hor_cut)
+    rv = data['RV_avg']
+    edges = fig8_40perc.rh_bin_edges()
+    rows = np.arange(len(rv))
+
+    results = []
+    for ndrop, max_rv in itertools.product(ndrops, max_rvs):
+        kept = (rows >= ndrop) & (rv < max_rv)
+        stats = binning.binned_stats(rv[kept], pd.DataFrame({'hor':
+            hor[kept], 'ver': ver[kept]}), edges, closed='neither')
+        disp = {col: stats[col + '_mean'].values[-1] -
+            stats[col + '_mean'].values[0] for col in ('hor', 'ver')}
+        spread = {col: np.mean(stats[col + '_std'].values*nsig)
+            for col in ('hor', 'ver')}
+
+        for midnight_row, (hor_size, ver_size) in itertools.product(
+                midnight_rows, sizes):
+            zero = data['datetime'][min(ndrop + midnight_row, len(rv) - 1)]
+            results.append({'ver_cut': ver_cut, 'hor_cut': hor_cut,
+                'ndrop': ndrop, 'midnight_row': midnight_row,
+                'max_rv': max_rv, 'hor_size': hor_size,
+                'ver_size': ver_size, 'ver_resets': nver,
+                'hor_resets': nhor, 'rows': int(kept.sum()),
+                'day_zero': pd.Timestamp(zero).strftime('%H:%M'),
+                'disp_hor_mm': disp['hor'], 'disp_ver_mm': disp['ver'],
+                'disp_hor_perc': disp['hor']/hor_size*100,
+                'disp_ver_perc': disp['ver']/ver_size*100,
+                'mean_std_hor': spread['hor']/hor_size*100,
+                'mean_std_ver': spread['ver']/ver_size*100})
+
+    return results
+
+def sweep(logfile=read_data.LOGFILE, ver_cuts=(read_data.VER_CUT,),
+        hor_cuts=(read_data.HOR_CUT,), ndrops=(read_data.NDROP,),
+        midnight_rows=(read_data.MIDNIGHT_ROW,), max_rvs=(read_data.MAX_RV,),
+        hor_sizes=(fig8_40perc.HOR_TOTSIZE,),
+        ver_sizes=(fig8_40perc.VER_TOTSIZE,), nprocs=1, data=None, **params):
+    """
+    Sensitivity of the cleaned data and the displacement at a difference of
+    40% relative humidity (see fig8_40perc) to the constants of the
+    cleaning procedure and the size of the leather. The log file is parsed
+    once; every pair of reset thresholds is evaluated by a worker process
+    for all combinations of the other constants (see sweep_cuts).
+
+    Input:
+    - logfile [str]: path to the log file (default = read_data.LOGFILE)
+    - ver_cuts, hor_cuts [list of float]: values of read_data.VER_CUT and
+      read_data.HOR_CUT
+    - ndrops [list of int]: values of read_data.NDROP
+    - midnight_rows [list of int]: values of read_data.MIDNIGHT_ROW
+    - max_rvs [list of float]: values of read_data.MAX_RV
+    - hor_sizes, ver_sizes [list of float]: sizes of the leather (mm)
+    - nprocs [int]: number of worker processes (default = 1: no workers)
+    - data [dict]: output of prepare, if the log file was already parsed
+      (default = None)
+    - params: keyword arguments passed to prepare (tz, schema)
+
+    Output:
+    - results [pandas dataframe]: one row per combination of constants,
+      with the number of resets ('ver_resets', 'hor_resets'), the number
+      of rows that are kept, the time of day at which days_diff is 0
+      ('day_zero'), the displacement at a difference of 40% relative
+      humidity in mm and as a percentage ('disp_hor_mm', 'disp_hor_perc',
+      ...), and the mean spread per bin ('mean_std_hor', 'mean_std_ver',
+      %), as printed by fig8_40perc
+
+    """
+
+    if data is None:
+        data = prepare(logfile, **params)
+    sizes = list(itertools.product(hor_sizes, ver_sizes))
+    tasks = [(data, ver_cut, hor_cut, ndrops, midnight_rows, max_rvs, sizes)
+        for ver_cut, hor_cut in itertools.product(ver_cuts, hor_cuts)]
+
+    if nprocs == 1:
+        results = [sweep_cuts(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=nprocs) as pool:
+            results = list(pool.map(sweep_cuts, *zip(*tasks)))
+
+    return pd.DataFrame([row for rows in results for row in rows])
+
+def main(argv=None):
+
+    def values(kind):
+        return lambda text: [kind(v) for v in text.split(',')]
+
+    parser = argparse.ArgumentParser(description='Sensitivity of the '
+        'cleaned data and the displacement at a difference of 40%% RH to the '
+        'constants of the cleaning. Every option takes a comma-separated '
+        'list of values.')
+    parser.add_argument('logfile', nargs='?', default=read_data.LOGFILE,
+        help='log file (default: %(default)s)')
+    parser.add_argument('--ver-cut', type=values(float),
+        default=[read_data.VER_CUT], help='minimal vertical reset (mm)')
+    parser.add_argument('--hor-cut', type=values(float),
+        default=[read_data.HOR_CUT], help='minimal horizontal reset (mm)')
+    parser.add_argument('--ndrop', type=values(int),
+        default=[read_data.NDROP], help='rows dropped at the start')
+    parser.add_argument('--midnight-row', type=values(int),
+        default=[read_data.MIDNIGHT_ROW], help='first row at 00:00h')
+    parser.add_argument('--max-rv', type=values(float),
+        default=[read_data.MAX_RV], help='largest average RV (%%)')
+    parser.add_argument('--hor-size', type=values(float),
+        default=[fig8_40perc.HOR_TOTSIZE], help='horizontal size (mm)')
+    parser.add_argument('--ver-size', type=values(float),
+        default=[fig8_40perc.VER_TOTSIZE], help='vertical size (mm)')
+    parser.add_argument('--nprocs', type=int, default=1,
+        help='number of worker processes (default: %(default)s)')
+    parser.add_argument('--output', default=None,
+        help='write the results to this .csv file')
+    args = parser.parse_args(argv)
+
+    results = sweep(args.logfile, args.ver_cut, args.hor_cut, args.ndrop,
+        args.midnight_row, args.max_rv, args.hor_size, args.ver_size,
+        nprocs=args.nprocs)
+    print(results.round(4).to_string(index=False))
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+# Generate synthetic log files in the format of the data logger
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import read_data
+
+def first_order_lag(x, dt, tau):
+    """
+    Response of a first order system with time constant tau to the input x.
+
+    Input:
+    - x [numpy array]: input signal
+    - dt [numpy array]: time since the previous sample (same unit as tau)
+    - tau [float]: time constant
+
+    Output:
+    - y [numpy array]: response
+
+    """
+
+    y = np.empty(len(x))
+    y[0] = x[0]
+    alpha = 1 - np.exp(-dt/tau)
+    for i in range(1, len(x)):
+        y[i] = y[i-1] + alpha[i]*(x[i] - y[i-1])
+
+    return y
+
+def ar1_noise(rng, dt, tau, sigma):
+    """
+    Mean-reverting (Ornstein-Uhlenbeck) noise sampled at irregular times:
+    an AR(1) process with mean zero, standard deviation sigma and
+    correlation time tau. Unlike a random walk, its spread does not grow
+    with the length of the series.
+
+    Input:
+    - rng [numpy Generator]: random number generator
+    - dt [numpy array]: time since the previous sample (same unit as tau)
+    - tau [float]: correlation time
+    - sigma [float]: standard deviation
+
+    Output:
+    - y [numpy array]: noise
+
+    """
+
+    phi = np.exp(-dt/tau)
+    z = rng.normal(0, sigma, len(dt))*np.sqrt(1 - phi**2)
+    y = np.empty(len(dt))
+    y[0] = rng.normal(0, sigma)
+    for i in range(1, len(dt)):
+        y[i] = phi[i]*y[i-1] + z[i]
+
+    return y
+
+def generate_data(ndays=365, interval_mins=30, nsensors=8, nresets=12,
+        nglitches=2, irregular=True, start='2021-03-08 13:16:00',
+        tz=read_data.TIMEZONE, seed=0):
+    """
+    Generate synthetic logger data: relative humidity and temperature with
+    seasonal and daily cycles, and a leather displacement that follows the
+    relative humidity with a delay.
+
+    Input:
+    - ndays [float]: length of the log (days)
+    - interval_mins [float]: regular sampling interval (minutes)
+    - nsensors [int]: number of temperature/humidity sensor pairs
+    - nresets [int]: number of device resets, at which the displacement
+      reading jumps back to (close to) zero
+    - nglitches [int]: number of samples with a relative humidity above 100%
+    - irregular [bool]: start with an hour of 2-minute samples and add a few
+      gaps, as in the real log
+    - start [str]: time of the first sample, in standard time
+    - tz [str]: time zone of the logger clock; the clock switches to summer
+      time in this time zone. None for a clock without summer time.
+    - seed [int]: seed of the random number generator
+
+    Output:
+    - timestamps [numpy array]: logger clock time (seconds since 1970)
+    - values [numpy array]: ver, hor (cm, as in the log) and T/RV per
+      sensor, one row per sample
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Sample times in minutes since the start, in standard time
+    minutes = np.arange(0, ndays*24*60, interval_mins, dtype=float)
+    if irregular:
+        minutes = np.concatenate((np.arange(0, 60, 2.0), minutes + 60))
+        gaps = rng.choice(len(minutes), size=min(5, len(minutes)//100),
+            replace=False)
+        for gap in gaps:
+            minutes[gap:] += rng.integers(1, 48)*interval_mins
+    days = minutes/(24*60)
+    nrows = len(minutes)
+
+    # Climate: seasonal and daily cycles plus slow random variations. The
+    # relative humidity stays below 100%, so that only the glitches exceed
+    # it.
+    dt = np.diff(days, prepend=days[0])
+    RV = 60 - 15*np.cos(2*np.pi*(days - 30)/365) + \
+        3*np.sin(2*np.pi*days) + ar1_noise(rng, dt, 3.0, 3.0)
+    RV = np.clip(RV, 0, 99.9)
+    T = 17 + 3*np.cos(2*np.pi*(days - 30)/365) + 1.5*np.sin(2*np.pi*days)
+
+    values = np.empty((nrows, 2 + 2*nsensors))
+    for i in range(nsensors):
+        values[:, 2 + 2*i] = T + rng.normal(0, 0.8) + rng.normal(0, 0.05,
+            nrows)
+        values[:, 3 + 2*i] = np.clip(RV + rng.normal(0, 3) +
+            rng.normal(0, 0.2, nrows), 0, 99.9)
+
+    # Displacement (mm) follows the relative humidity with a delay
+    ver = 0.3*(first_order_lag(RV, dt, 1.5) - RV[0])
+    hor = 0.25*(first_order_lag(RV, dt, 3.0) - RV[0])
+
+    # Device resets: the reading jumps back to zero. Only moments at which
+    # the reading is far enough from zero to be recognised are used.
+    for disp in (ver, hor):
+        for i in np.sort(rng.choice(np.arange(nrows//50, nrows),
+                size=min(nresets//2, nrows//100), replace=False)):
+            if np.abs(disp[i-1]) > 1.0:
+                disp[i:] -= disp[i-1] + rng.normal(0, 0.02)
+
+    # The log holds the displacement in cm, with the opposite sign
+    values[:, 0] = np.round(-ver/10, 3)
+    values[:, 1] = np.round(-hor/10, 3)
+    values[:, 2:] = np.round(values[:, 2:], 1)
+
+    # Sensor glitches
+    glitches = rng.choice(nrows, size=min(nglitches, nrows), replace=False)
+    values[glitches, 3::2] = 100 + rng.uniform(1, 10, (len(glitches),
+        nsensors))
+
+    # Clock time of the logger
+    times = pd.Timestamp(start) + pd.to_timedelta(np.round(minutes),
+        unit='min')
+    if tz is not None:
+        standard = min(pd.Timestamp(times[0].year, 1, 1).tz_localize(
+            tz).utcoffset(), pd.Timestamp(times[0].year, 7, 1).tz_localize(
+            tz).utcoffset())
+        times = (times - standard).tz_localize('UTC').tz_convert(
+            tz).tz_localize(None)
+    timestamps = times.values.astype('datetime64[s]').astype(np.int64)
+
+    return timestamps, values
+
+def make_schema(nsensors=8):
+    """
+    Schema of a synthetic log (see read_data.load_schema): the averages
+    over all sensors, over the first half of the sensors ('front') and over
+    the second half ('back').
+
+    Input:
+    - nsensors [int]: number of temperature/humidity sensor pairs
+
+    Output:
+    - schema [dict]
+
+    """
+
+    numbers = [str(i + 1) for i in range(nsensors)]
+    front = numbers[:max(nsensors//2, 1)]
+    back = numbers[max(nsensors//2, 1):] or front
+
+    columns = ['ver_rel', 'hor_rel']
+    for i in numbers:
+        columns += ['T' + i, 'RV' + i]
+    groups = {}
+    for quantity in ('RV', 'T'):
+        for group, members in (('avg', numbers), ('front', front),
+                ('back', back)):
+            groups[quantity + '_' + group] = [quantity + i for i in members]
+
+    return {'columns': columns, 'groups': groups}
+
+def write_log(logfile, timestamps, values):
+    """
+    Write data in the format of the data logger (see read_data.parse_log).
+
+    Input:
+    - logfile [str]: path to the log file
+    - timestamps [numpy array]: logger clock time (seconds since 1970)
+    - values [numpy array]: ver, hor (cm) and T/RV per sensor
+
+    """
+
+    lines = np.char.replace(np.datetime_as_string(
+        timestamps.astype('datetime64[s]')), 'T', ' ').astype(object)
+    for j in range(values.shape[1]):
+        fmt = '\t%.3f' if j < 2 else '\t%.2f'
+        lines = lines + np.char.mod(fmt, values[:, j]).astype(object)
+    lines = lines + '\tEND'
+
+    with open(logfile, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic log '
+        'file in the format of the data logger.')
+    parser.add_argument('logfile', help='path of the log file to write')
+    parser.add_argument('--days', type=float, default=365,
+        help='length of the log in days (default: %(default)s)')
+    parser.add_argument('--interval', type=float, default=30,
+        help='sampling interval in minutes (default: %(default)s)')
+    parser.add_argument('--sensors', type=int, default=8,
+        help='number of T/RV sensor pairs (default: %(default)s)')
+    parser.add_argument('--resets', type=int, default=12,
+        help='number of device resets (default: %(default)s)')
+    parser.add_argument('--glitches', type=int, default=2,
+        help='number of samples with RV > 100%% (default: %(default)s)')
+    parser.add_argument('--regular', action='store_true',
+        help='regular sampling, without the 2-minute start and gaps')
+    parser.add_argument('--tz', default=read_data.TIMEZONE,
+        help='time zone of the logger clock, or "none" for a clock without '
+        'summer time (default: %(default)s)')
+    parser.add_argument('--schema', default=None,
+        help='also write the schema of the log to this file; name it '
+        'schema.json in the directory of the log to use it with read_data')
+    parser.add_argument('--seed', type=int, default=0,
+        help='seed of the random number generator (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    timestamps, values = generate_data(ndays=args.days,
+        interval_mins=args.interval, nsensors=args.sensors,
+        nresets=args.resets, nglitches=args.glitches,
+        irregular=not args.regular,
+        tz=None if args.tz.lower() == 'none' else args.tz, seed=args.seed)
+    write_log(args.logfile, timestamps, values)
+    if args.schema is not None:
+        with open(args.schema, 'w') as f:
+            json.dump(make_schema(args.sensors), f, indent=1)
+    print('Wrote', len(timestamps), 'samples to', args.logfile)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
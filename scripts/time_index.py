@@ -0,0 +1,186 @@
+# Fast selection of time ranges in the cleaned data, by binary search
+# Sarah Brands & Amber Brands
+# Created October 2026
+
+import numpy as np
+import pandas as pd
+
+def time_values(times):
+    """
+    Times of the samples as int64 nanoseconds, the form that is searched by
+    the other functions. For the column 'datetime' of the cleaned data this
+    is a view, not a copy, so it is cheap to call before every query. The
+    times must be sorted, which they are after read_data.data2df (the time
+    is converted to continuous standard time).
+
+    Input:
+    - times [pandas series, index or numpy array]: datetimes, e.g.
+      df['datetime']
+
+    Output:
+    - t [numpy array]: int64 nanoseconds
+
+    """
+
+    return np.asarray(times).astype('datetime64[ns]', copy=False).view(
+        np.int64)
+
+def to_ns(moments):
+    """
+    Convert moments (strings, datetimes or timestamps) to int64 nanoseconds.
+
+    Input:
+    - moments [str, datetime or list of these]
+
+    Output:
+    - t [int or numpy array]
+
+    """
+
+    if np.ndim(moments) == 0:
+        return pd.Timestamp(moments).value
+
+    return pd.DatetimeIndex(moments).values.view(np.int64)
+
+def time_range(times, start=None, end=None):
+    """
+    Positions of the samples in the range [start, end).
+
+    Input:
+    - times [pandas series or numpy array]: sorted datetimes
+    - start [str or datetime]: start of the range (default = None: from the
+      first sample)
+    - end [str or datetime]: end of the range, excluded (default = None: up
+      to and including the last sample)
+
+    Output:
+    - rows [slice]: positions of the samples, for use with iloc
+
+    """
+
+    t = time_values(times)
+    i0 = 0 if start is None else np.searchsorted(t, to_ns(start), 'left')
+    i1 = len(t) if end is None else np.searchsorted(t, to_ns(end), 'left')
+
+    return slice(int(i0), int(max(i0, i1)))
+
+def select_range(df, start=None, end=None, column='datetime'):
+    """
+    Samples of a dataframe in the range [start, end), see time_range.
+
+    Input:
+    - df [pandas dataframe]: data sorted by time, e.g. from data2df
+    - start, end [str or datetime]: range (None: no limit)
+    - column [str]: column with the times (default = 'datetime')
+
+    Output:
+    - df_range [pandas dataframe]: view on the selected rows
+
+    """
+
+    return df.iloc[time_range(df[column], start, end)]
+
+def around(times, moment, before, after):
+    """
+    Positions of the samples around an event: from a time before it up to
+    (and including) a time after it.
+
+    Input:
+    - times [pandas series or numpy array]: sorted datetimes
+    - moment [str or datetime]: time of the event
+    - before, after [str or timedelta]: length of the period before and
+      after the event, understood by pandas.Timedelta (e.g. '6h')
+
+    Output:
+    - rows [slice]: positions of the samples, for use with iloc
+
+    """
+
+    t = time_values(times)
+    moment = to_ns(moment)
+    i0 = np.searchsorted(t, moment - pd.Timedelta(before).value, 'left')
+    i1 = np.searchsorted(t, moment + pd.Timedelta(after).value, 'right')
+
+    return slice(int(i0), int(i1))
+
+def nearest(times, moments):
+    """
+    Positions of the samples closest in time to given moments.
+
+    Input:
+    - times [pandas series or numpy array]: sorted datetimes
+    - moments [str, datetime or list of these]
+
+    Output:
+    - rows [int or numpy array]: position of the nearest sample per moment
+
+    """
+
+    t = time_values(times)
+    moments = to_ns(moments)
+    after = np.clip(np.searchsorted(t, moments), 1, len(t) - 1)
+    rows = np.where(moments - t[after - 1] <= t[after] - moments, after - 1,
+        after)
+
+    return rows if np.ndim(rows) else int(rows)
+
+def value_at(times, values, moments):
+    """
+    Value of a series at given moments, interpolated linearly between the
+    samples, e.g. days_diff at a date to position ticks or axis limits.
+
+    Input:
+    - times [pandas series or numpy array]: sorted datetimes
+    - values [pandas series or numpy array]: values per sample
+    - moments [str, datetime or list of these]
+
+    Output:
+    - values [float or numpy array]
+
+    """
+
+    return np.interp(to_ns(moments), time_values(times),
+        np.asarray(values, dtype=float))
+
+def month_starts(times):
+    """
+    Positions of the first sample of every calendar month that starts
+    within the data (and that has data).
+
+    Input:
+    - times [pandas series or numpy array]: sorted datetimes
+
+    Output:
+    - rows [numpy array]: positions of the first sample of each month
+
+    """
+
+    t = time_values(times)
+    first = pd.Timestamp(t[0])
+    months = pd.date_range(first.to_period('M').start_time, pd.Timestamp(t[-1])
+        + pd.offsets.MonthBegin(1), freq='MS').values.view(np.int64)
+    months = months[months >= t[0]]
+
+    rows = np.searchsorted(t, months, 'left')
+    has_data = rows[:-1] < np.searchsorted(t, months[1:], 'left')
+
+    return rows[:-1][has_data]
+
+def period_starts(times, freq):
+    """
+    The multiples of a time step, e.g. every 4 hours or every day, from the
+    first to the last sample, e.g. to place ticks.
+
+    Input:
+    - times [pandas series or numpy array]: sorted datetimes
+    - freq [str]: step, understood by pandas.date_range (e.g. '4h', '1D')
+
+    Output:
+    - moments [pandas DatetimeIndex]: the multiples of the step
+
+    """
+
+    t = time_values(times)
+    first = pd.Timestamp(t[0]).ceil(freq)
+
+    return pd.date_range(first, pd.Timestamp(t[-1]), freq=freq)